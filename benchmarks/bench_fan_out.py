@@ -0,0 +1,35 @@
+"""Пропускная способность рассылки уведомлений подписчикам."""
+from benchmarks.utils import measure, report, setup
+
+FOLLOWERS = 100000
+
+
+def main():
+    setup()
+    from posts.models import Follow, Post, User
+    from notifications import tasks
+    from notifications.models import Notification
+
+    author = User.objects.create_user(username='bench_star')
+    User.objects.bulk_create(
+        (User(username=f'bench_fan_{i}', password='!')
+         for i in range(FOLLOWERS)),
+    )
+    followers = User.objects.filter(
+        username__startswith='bench_fan_'
+    ).values_list('pk', flat=True)
+    Follow.objects.bulk_create(
+        (Follow(user_id=pk, author=author) for pk in followers.iterator()),
+    )
+    post = Post.objects.create(author=author, text='Пост для всех')
+
+    def fan_out():
+        Notification.objects.all().delete()
+        tasks.fan_out_post(post.pk)
+
+    seconds, peak = measure(fan_out, repeat=3)
+    report('fan_out_post, followers notified', seconds, peak, FOLLOWERS)
+
+
+if __name__ == '__main__':
+    main()
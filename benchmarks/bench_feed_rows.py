@@ -0,0 +1,47 @@
+"""Лента на строках PostRow против экземпляров моделей ORM."""
+from benchmarks.utils import make_posts, measure, report, setup
+
+POSTS = 20000
+
+
+def main():
+    setup()
+    from django.core.paginator import Paginator
+
+    from posts.models import Post
+    from posts.rows import PostRows
+
+    make_posts(posts=POSTS)
+
+    def orm_page():
+        page = Paginator(
+            Post.objects.select_related('author', 'group'), 10
+        ).get_page(5)
+        return [(p.author.get_full_name(), p.preview_html) for p in page]
+
+    def rows_page():
+        page = Paginator(PostRows(Post.objects.all()), 10).get_page(5)
+        return [(p.author.get_full_name(), p.preview_html) for p in page]
+
+    def orm_export():
+        for post in Post.objects.select_related(
+            'author', 'group'
+        ).iterator(2000):
+            post.text, post.author.username
+
+    def rows_export():
+        for row in PostRows(Post.objects.all()):
+            row.as_dict()
+
+    for name, func, items in (
+        ('page: orm select_related', orm_page, 10),
+        ('page: PostRows', rows_page, 10),
+        ('export: orm iterator', orm_export, POSTS),
+        ('export: PostRows', rows_export, POSTS),
+    ):
+        seconds, peak = measure(func, repeat=3)
+        report(name, seconds, peak, items)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Байты и время: вторая страница целиком против фрагмента."""
+from benchmarks.utils import make_posts, measure, report, setup
+
+REQUESTS = 50
+
+
+def main():
+    setup()
+    from django.core.cache import cache
+    from django.test import Client
+
+    make_posts(posts=2000)
+    client = Client()
+    first = client.get('/')
+    cursor = first.context['next_cursor']
+    pages = (
+        ('index ?page=2', '/', {'page': 2}),
+        ('index fragment', '/fragments/', {'cursor': cursor}),
+        ('profile ?page=2', '/profile/bench_author_0/', {'page': 2}),
+        ('profile fragment', '/profile/bench_author_0/fragments/',
+         {'cursor': client.get('/profile/bench_author_0/').context[
+             'next_cursor']}),
+    )
+    for name, url, params in pages:
+        size = len(client.get(url, params).content)
+
+        def fetch():
+            for _ in range(REQUESTS):
+                # Без кеша фрагментов меряем рендер, а не чтение кеша
+                cache.clear()
+                client.get(url, params)
+
+        seconds, _ = measure(fetch, repeat=3)
+        report(f'{name} ({size} bytes)', seconds, items=REQUESTS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Место на диске при повторных загрузках одной картинки.
+
+Сравнивает обычное хранилище (каждая загрузка - свой файл и своя
+миниатюра) с хранилищем по содержимому из posts.storage.
+"""
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.utils import report, setup
+
+UPLOADS = 200
+SIZE = (800, 600)
+
+
+def make_image():
+    from PIL import Image
+    image = Image.frombytes('RGB', SIZE, os.urandom(SIZE[0] * SIZE[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def upload_all(storage, content):
+    from django.core.files.base import ContentFile
+    from sorl.thumbnail import get_thumbnail
+    from sorl.thumbnail.images import ImageFile
+
+    from posts.images import THUMBNAIL_GEOMETRY, THUMBNAIL_OPTIONS
+
+    for _ in range(UPLOADS):
+        name = storage.save('posts/meme.jpg', ContentFile(content))
+        get_thumbnail(
+            ImageFile(name, storage), THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        )
+
+
+def main():
+    setup()
+    from django.core.files.storage import FileSystemStorage
+    from django.test import override_settings
+
+    from posts.blobs import disk_usage
+    from posts.storage import ContentAddressedStorage
+
+    content = make_image()
+    storages = {
+        'flat upload_to': FileSystemStorage,
+        'content-addressed': ContentAddressedStorage,
+    }
+    for label, storage_class in storages.items():
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(MEDIA_ROOT=root):
+            storage = storage_class()
+            # Один прогон: повтор изменил бы сами замеры диска
+            start = time.perf_counter()
+            upload_all(storage, content)
+            seconds = time.perf_counter() - start
+            report(f'{UPLOADS} uploads, {label}', seconds, items=UPLOADS)
+            files, size = disk_usage(root)
+            print(f'{"":<40} {files:10d} files {size / 1024:12.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""Пропускная способность ограничителя частоты запросов."""
+from benchmarks.utils import measure, report, setup
+
+CHECKS = 50000
+CLIENTS = 1000
+
+
+def main():
+    setup()
+    from django.core.cache import cache
+
+    from core.ratelimit import TokenBucket
+
+    bucket = TokenBucket(10 ** 9, 60)
+
+    def one_client():
+        for _ in range(CHECKS):
+            bucket.take('bench:one')
+
+    def many_clients():
+        for i in range(CHECKS):
+            bucket.take(f'bench:{i % CLIENTS}')
+
+    cache.clear()
+    seconds, peak = measure(one_client, repeat=3)
+    report('TokenBucket.take, one key', seconds, peak, CHECKS)
+    cache.clear()
+    seconds, peak = measure(many_clients, repeat=3)
+    report(f'TokenBucket.take, {CLIENTS} keys', seconds, peak, CHECKS)
+
+
+if __name__ == '__main__':
+    main()
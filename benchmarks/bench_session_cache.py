@@ -0,0 +1,59 @@
+"""Задержка follow_index с сессиями в БД и с cached_db + кешем юзера."""
+from benchmarks.utils import make_posts, measure, report, setup
+
+REQUESTS = 200
+
+CONFIGS = (
+    ('db sessions, ModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': [
+            'django.contrib.auth.backends.ModelBackend',
+        ],
+    }),
+    ('cached_db sessions, CachedModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'AUTHENTICATION_BACKENDS': ['users.backends.CachedModelBackend'],
+    }),
+)
+
+
+def main():
+    setup()
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client, override_settings
+
+    from posts.models import Follow, User
+
+    authors = make_posts(posts=2000)
+    reader = User.objects.create_user(username='bench_reader')
+    Follow.objects.bulk_create(
+        Follow(user=reader, author=author) for author in authors
+    )
+
+    for name, overrides in CONFIGS:
+        with override_settings(**overrides):
+            cache.clear()
+            client = Client()
+            client.force_login(reader)
+            client.get('/follow/')
+
+            def follow_index():
+                for _ in range(REQUESTS):
+                    client.get('/follow/')
+
+            # queries_log очищается на request_started, поэтому запросы
+            # считаем обёрткой над выполнением
+            queries = []
+            with connection.execute_wrapper(
+                lambda execute, sql, *args: queries.append(sql)
+                or execute(sql, *args)
+            ):
+                client.get('/follow/')
+            seconds, _ = measure(follow_index, repeat=3)
+            report(f'{name} ({len(queries)} queries)', seconds,
+                   items=REQUESTS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""Память и время построения карты сайта при росте таблицы постов."""
+import tempfile
+
+from benchmarks.utils import make_posts, measure, report, setup
+
+SIZES = (10000, 50000)
+
+
+def main():
+    setup()
+    from django.test import override_settings
+
+    from posts import sitemaps
+    from posts.models import Post
+
+    authors = make_posts(authors=10, posts=SIZES[0])
+    total = SIZES[0]
+    with tempfile.TemporaryDirectory() as root, \
+            override_settings(SITEMAP_ROOT=root):
+        for size in SIZES:
+            Post.objects.bulk_create(
+                (Post(author=authors[0], text='Пост')
+                 for _ in range(size - total)),
+            )
+            total = size
+            seconds, peak = measure(
+                lambda: sitemaps.build(full=True), repeat=1
+            )
+            report(f'build_sitemaps, {size} posts', seconds, peak, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Байты картинок на страницу ленты для разных ширин экрана.
+
+До вариантов каждый клиент получал кадр 960x339 в JPEG; со srcset
+браузер берёт самый узкий кадр не уже экрана с учётом плотности
+пикселей и WebP, если он собран в Pillow.
+"""
+import io
+import tempfile
+import time
+
+from benchmarks.utils import report, setup
+
+POSTS_PER_PAGE = 10
+SIZE = (1600, 1200)
+# Ширина кадра в физических пикселях, которую выберет браузер
+SCREENS = {
+    'phone 360px @2x': 720,
+    'phone 360px @1x': 360,
+    'desktop 960px @1x': 960,
+}
+
+
+def make_photo():
+    """Картинка, которая сжимается похоже на фотографию."""
+    from PIL import Image, ImageFilter
+    noise = Image.effect_noise(SIZE, 64).filter(ImageFilter.GaussianBlur(3))
+    gradient = Image.linear_gradient('L').resize(SIZE)
+    photo = Image.merge('RGB', (noise, gradient, gradient.rotate(90)))
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def thumbnail_size(url):
+    from django.conf import settings
+    from django.core.files.storage import default_storage
+    return default_storage.size(url[len(settings.MEDIA_URL):])
+
+
+def main():
+    setup()
+    from django.core.files.base import ContentFile
+    from django.test import override_settings
+
+    from posts import images
+    from posts.storage import image_storage
+
+    with tempfile.TemporaryDirectory() as root, \
+            override_settings(MEDIA_ROOT=root):
+        photos = [
+            image_storage.save('posts/photo.jpg', ContentFile(make_photo()))
+            for _ in range(POSTS_PER_PAGE)
+        ]
+        start = time.perf_counter()
+        sources = [images.variants(name) for name in photos]
+        seconds = time.perf_counter() - start
+        report('build variants', seconds, items=len(photos))
+        # Последний источник - JPEG, последний кадр в нём - 960x339
+        baseline = sum(
+            thumbnail_size(variants[-1][1][-1][0]) for variants in sources
+        )
+        print(f'{"960x339 JPEG for everyone":<40} {baseline / 1024:10.1f} KiB')
+        for screen, pixels in SCREENS.items():
+            total = 0
+            for variants in sources:
+                # Первый <source>, который понимает браузер
+                _, urls = variants[0]
+                url = next(
+                    (url for url, width in urls if width >= pixels),
+                    urls[-1][0],
+                )
+                total += thumbnail_size(url)
+            saved = 100 * (1 - total / baseline)
+            print(
+                f'{"srcset, " + screen:<40} {total / 1024:10.1f} KiB '
+                f'{saved:6.1f}% less'
+            )
+        print(f'formats: {", ".join(images.FORMATS)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Пакетный расчёт рекомендаций на случайном графе подписок.
+
+Размер графа можно задать аргументами: число пользователей и рёбер,
+например python -m benchmarks.bench_suggestions 100000 1000000.
+"""
+import random
+import sys
+
+from benchmarks.utils import measure, report, setup
+
+USERS = 5000
+EDGES = 75000
+
+
+def main(users=USERS, edges_count=EDGES):
+    setup()
+    from posts.models import Follow, User
+    from posts.suggestions import compute_suggestions
+
+    User.objects.bulk_create(
+        (User(username=f'bench_user_{i}', password='!')
+         for i in range(users)),
+    )
+    ids = list(User.objects.values_list('pk', flat=True))
+    rng = random.Random(1)
+    # Популярность авторов по Ципфу, как в настоящих соцсетях
+    weights = [1 / (rank + 1) for rank in range(len(ids))]
+    edges = set()
+    while len(edges) < edges_count:
+        followers = rng.choices(ids, k=edges_count - len(edges))
+        authors = rng.choices(ids, weights=weights, k=len(followers))
+        edges.update(pair for pair in zip(followers, authors)
+                     if pair[0] != pair[1])
+    Follow.objects.bulk_create(
+        (Follow(user_id=user, author_id=author) for user, author in edges),
+    )
+    seconds, peak = measure(compute_suggestions, repeat=1)
+    print(f'{len(edges)} follow edges')
+    report('compute_suggestions, users', seconds, peak, users)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
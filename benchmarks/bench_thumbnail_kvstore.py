@@ -0,0 +1,103 @@
+"""Чтение ключей миниатюр страницы ленты: стандартное хранилище sorl
+против core.thumbnails.
+
+Стандартное хранилище спрашивает кеш за каждым кадром, а при пустом
+кеше - и базу. Новое читает ключи страницы одним prefetch(), а
+повторные страницы процесса обходятся без кеша и базы.
+"""
+import io
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.utils import report, setup
+
+POSTS_PER_PAGE = 10
+PAGES = 50
+
+
+def make_image(index):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (index, 0, 0)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def render_page(posts, prefetch):
+    from posts import images
+    if prefetch:
+        images.prefetch(posts)
+    for post in posts:
+        images.stored_variants(post.image)
+
+
+def cache_calls(posts, prefetch):
+    """Обращения к общему кешу за одну страницу."""
+    from django.core.cache import cache
+    calls = 0
+
+    def counted(method):
+        def wrapper(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    with mock.patch.multiple(cache, **{
+        name: counted(getattr(cache, name))
+        for name in ('get', 'get_many', 'set', 'set_many')
+    }):
+        render_page(posts, prefetch)
+    return calls
+
+
+def run(name, store, posts, prefetch):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from sorl.thumbnail import default
+
+    default.kvstore._wrapped = store
+    cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        render_page(posts, prefetch)
+    queries = len(context.captured_queries)
+    # Другая страница того же процесса: кеш уже заполнен
+    calls = cache_calls(posts, prefetch)
+    start = time.perf_counter()
+    for _ in range(PAGES):
+        render_page(posts, prefetch)
+    seconds = (time.perf_counter() - start) / PAGES
+    report(name, seconds)
+    print(f'{"":<4}cold: {queries} DB queries; warm: {calls} cache calls')
+
+
+def main():
+    setup()
+    from django.core.files.base import ContentFile
+    from django.test import override_settings
+    from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+
+    from core import thumbnails
+    from posts import images
+    from posts.models import Post
+    from posts.storage import image_storage
+
+    with tempfile.TemporaryDirectory() as root, \
+            override_settings(MEDIA_ROOT=root):
+        posts = [
+            Post(image=image_storage.save(
+                f'posts/{i}.png', ContentFile(make_image(i))
+            ))
+            for i in range(POSTS_PER_PAGE)
+        ]
+        # Кадры строятся заранее, как это делает warm_thumbnails
+        for post in posts:
+            images.variants(post.image)
+        run('sorl cached_db', KVStore(), posts, False)
+        run('core.thumbnails', thumbnails.KVStore(), posts, False)
+        run('core.thumbnails + prefetch', thumbnails.KVStore(), posts, True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Время пакетного пересчёта ленты популярного."""
+import random
+
+from benchmarks.utils import make_posts, measure, report, setup
+
+POSTS = 20000
+COMMENTS = 50000
+FOLLOWERS = 5000
+
+
+def main():
+    setup()
+    from posts import trending
+    from posts.models import Comment, Follow, Post, User
+
+    authors = make_posts(authors=50, posts=POSTS)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    rng = random.Random(1)
+    Comment.objects.bulk_create(
+        (Comment(author=rng.choice(authors), post_id=rng.choice(post_ids),
+                 text='Комментарий')
+         for _ in range(COMMENTS)),
+    )
+    User.objects.bulk_create(
+        (User(username=f'bench_fan_{i}', password='!')
+         for i in range(FOLLOWERS)),
+    )
+    fans = User.objects.filter(username__startswith='bench_fan_')
+    Follow.objects.bulk_create(
+        (Follow(user_id=pk, author=rng.choice(authors))
+         for pk in fans.values_list('pk', flat=True)),
+    )
+    seconds, peak = measure(trending.rank, repeat=3)
+    report('trending.rank, events', seconds, peak,
+           POSTS + COMMENTS + FOLLOWERS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Сколько просмотров в секунду выдерживают счётчики постов."""
+import random
+
+from benchmarks.utils import make_posts, measure, report, setup
+
+VIEWS = 20000
+
+
+def main():
+    setup()
+    from django.db.models import F
+
+    from posts.counters import ViewBuffer
+    from posts.models import Post
+
+    make_posts(authors=10, posts=1000)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    rng = random.Random(1)
+    # Просмотры неравномерны: свежие и популярные посты смотрят чаще
+    hits = rng.choices(
+        post_ids, weights=[1 / (i + 1) for i in range(len(post_ids))],
+        k=VIEWS
+    )
+
+    def direct():
+        for post_id in hits:
+            Post.objects.filter(pk=post_id).update(views=F('views') + 1)
+
+    def buffered():
+        buffer = ViewBuffer()
+        for post_id in hits:
+            buffer.hit(post_id)
+        buffer.flush()
+
+    seconds, peak = measure(direct, repeat=1)
+    report('UPDATE per view, views', seconds, peak, VIEWS)
+    seconds, peak = measure(buffered, repeat=3)
+    report('ViewBuffer, views', seconds, peak, VIEWS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Общие помощники для бенчмарков.
+
+Запуск из корня репозитория: python -m benchmarks.<имя_модуля>.
+Бенчмарки работают на временной тестовой базе и не трогают db.sqlite3.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+
+def setup():
+    """Настраивает Django и создаёт тестовую базу."""
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def make_posts(authors=10, posts=1000, group=True):
+    """Создаёт авторов, группу и посты пачками, возвращает авторов."""
+    from posts.models import Group, Post, User
+    User.objects.bulk_create(
+        User(username=f'bench_author_{i}', password='!')
+        for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith='bench_author_'))
+    bench_group = None
+    if group:
+        bench_group, _ = Group.objects.get_or_create(
+            slug='bench', defaults={'title': 'Бенчмарк', 'description': ''}
+        )
+    batch = []
+    for i in range(posts):
+        post = Post(
+            text=f'Пост номер {i}\n\n' + 'Текст поста. ' * 40,
+            author=users[i % len(users)],
+            group=bench_group,
+        )
+        post.render_text()
+        batch.append(post)
+    Post.objects.bulk_create(batch, batch_size=500)
+    return users
+
+
+def measure(func, repeat=5):
+    """Возвращает лучшее время выполнения и пик выделенной памяти."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def report(name, seconds, peak=None, items=None):
+    line = f'{name:<40} {seconds * 1000:10.2f} ms'
+    if items:
+        line += f' {items / seconds:12.0f} ops/s'
+    if peak is not None:
+        line += f' {peak / 1024:10.1f} KiB peak'
+    print(line)
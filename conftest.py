@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_view_counters():
+    """Просмотры тестовой базы не должны дожить до сброса при выходе."""
+    yield
+    from posts import counters
+    counters.views.reset()
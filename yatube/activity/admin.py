@@ -0,0 +1,23 @@
+from django.contrib import admin
+
+from .models import AuthorActivity, GroupActivity
+
+
+class GroupActivityAdmin(admin.ModelAdmin):
+    list_display = ('group', 'period', 'start', 'posts', 'comments')
+    list_filter = ('period', 'group')
+    date_hierarchy = 'start'
+
+
+class AuthorActivityAdmin(admin.ModelAdmin):
+    list_display = (
+        'author', 'period', 'start', 'posts', 'comments', 'follows'
+    )
+    list_filter = ('period',)
+    search_fields = ('author__username',)
+    raw_id_fields = ('author',)
+    date_hierarchy = 'start'
+
+
+admin.site.register(GroupActivity, GroupActivityAdmin)
+admin.site.register(AuthorActivity, AuthorActivityAdmin)
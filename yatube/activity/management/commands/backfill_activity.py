@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from activity import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Дописывает в сводки активности всю историю постов, комментариев '
+        'и подписок пачками'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить сводки и посчитать историю заново'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            rollups.reset()
+        total = rollups.roll_up(progress=self.progress)
+        self.stdout.write(f'Учтено строк: {total}')
+
+    def progress(self, source, rows):
+        self.stdout.write(f'{source}: +{rows}')
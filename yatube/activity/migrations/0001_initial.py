@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-19 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0014_post_views'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True, verbose_name='Источник')),
+                ('last_id', models.PositiveIntegerField(default=0, verbose_name='Последний id')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=4, verbose_name='Период')),
+                ('start', models.DateTimeField(verbose_name='Начало периода')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Активность группы',
+                'verbose_name_plural': 'Активность групп',
+                'ordering': ['start'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AuthorActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Час'), ('day', 'Сутки')], max_length=4, verbose_name='Период')),
+                ('start', models.DateTimeField(verbose_name='Начало периода')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментарии')),
+                ('follows', models.PositiveIntegerField(default=0, verbose_name='Новые подписчики')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Активность автора',
+                'verbose_name_plural': 'Активность авторов',
+                'ordering': ['start'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='groupactivity',
+            constraint=models.UniqueConstraint(fields=('group', 'period', 'start'), name='unique_group_activity'),
+        ),
+        migrations.AddConstraint(
+            model_name='authoractivity',
+            constraint=models.UniqueConstraint(fields=('author', 'period', 'start'), name='unique_author_activity'),
+        ),
+    ]
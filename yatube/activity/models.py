@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Activity(models.Model):
+    """Счётчики событий за час или за сутки."""
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = (
+        (HOUR, 'Час'),
+        (DAY, 'Сутки'),
+    )
+
+    period = models.CharField('Период', max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField('Начало периода')
+    posts = models.PositiveIntegerField('Посты', default=0)
+    comments = models.PositiveIntegerField('Комментарии', default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ['start']
+
+
+class GroupActivity(Activity):
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Группа'
+    )
+
+    class Meta(Activity.Meta):
+        # Уникальный индекс заодно обслуживает выборку графика
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'period', 'start'],
+                name='unique_group_activity'
+            ),
+        ]
+        verbose_name = 'Активность группы'
+        verbose_name_plural = 'Активность групп'
+
+
+class AuthorActivity(Activity):
+    """Посты автора, комментарии к ним и новые подписчики."""
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Автор'
+    )
+    follows = models.PositiveIntegerField('Новые подписчики', default=0)
+
+    class Meta(Activity.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'period', 'start'],
+                name='unique_author_activity'
+            ),
+        ]
+        verbose_name = 'Активность автора'
+        verbose_name_plural = 'Активность авторов'
+
+
+class RollupCursor(models.Model):
+    """До какого id строки источника уже учтены в счётчиках."""
+    source = models.CharField('Источник', max_length=50, unique=True)
+    last_id = models.PositiveIntegerField('Последний id', default=0)
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
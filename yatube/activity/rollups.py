@@ -0,0 +1,163 @@
+"""Инкрементальные сводки активности по группам и авторам.
+
+Посты, комментарии и подписки читаются по возрастанию id от курсора
+источника пачками по CHUNK_SIZE. Пачка сводится в памяти в приращения
+часовых и суточных счётчиков, которые пишутся в одной транзакции со
+сдвигом курсора, поэтому каждая строка учитывается ровно один раз.
+Страницы статистики читают только готовые сводки, без GROUP BY по
+таблицам постов и комментариев.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Post
+
+from .models import Activity, AuthorActivity, GroupActivity, RollupCursor
+
+CHUNK_SIZE = 2000
+# Строки моложе этого не учитываются: транзакция, получившая меньший
+# id, могла ещё не зафиксироваться, и курсор проскочил бы её строку
+SETTLE_DELAY = 60
+# Источник: (модель, поле времени, поле группы, поле автора);
+# имя источника совпадает с именем счётчика в сводке
+SOURCES = {
+    'posts': (Post, 'pub_date', 'group_id', 'author_id'),
+    'comments': (Comment, 'created', 'post__group_id', 'post__author_id'),
+    'follows': (Follow, 'created', None, 'author_id'),
+}
+# Сколько последних периодов показывает график
+CHART_LENGTH = {
+    Activity.HOUR: 48,
+    Activity.DAY: 30,
+}
+
+
+def truncate(moment, period):
+    """Начало часа или суток, в которые попадает moment."""
+    moment = timezone.localtime(moment).replace(
+        minute=0, second=0, microsecond=0
+    )
+    if period == Activity.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def add_counts(model, key_field, counter, deltas):
+    """Прибавляет приращения к сводкам, создавая недостающие строки."""
+    for (key, period, start), count in deltas.items():
+        lookup = {key_field: key, 'period': period, 'start': start}
+        updated = model.objects.filter(**lookup).update(
+            **{counter: F(counter) + count}
+        )
+        if not updated:
+            model.objects.create(**lookup, **{counter: count})
+
+
+def roll_chunk(source, until=None):
+    """Учитывает следующую пачку строк источника, возвращает их число."""
+    model, time_field, group_field, author_field = SOURCES[source]
+    if until is None:
+        until = timezone.now() - timedelta(seconds=SETTLE_DELAY)
+    cursor, _ = RollupCursor.objects.get_or_create(source=source)
+    fields = ['id', time_field, author_field]
+    if group_field:
+        fields.append(group_field)
+    rows = model.objects.filter(
+        id__gt=cursor.last_id
+    ).order_by('id').values_list(*fields)[:CHUNK_SIZE]
+    group_deltas = Counter()
+    author_deltas = Counter()
+    last_id = None
+    counted = 0
+    for pk, moment, author_id, *group_id in rows:
+        # Останавливаемся на первой неустоявшейся строке, чтобы курсор
+        # не перескочил её
+        if moment > until:
+            break
+        last_id = pk
+        counted += 1
+        for period in CHART_LENGTH:
+            start = truncate(moment, period)
+            author_deltas[(author_id, period, start)] += 1
+            if group_id and group_id[0] is not None:
+                group_deltas[(group_id[0], period, start)] += 1
+    if last_id is None:
+        return 0
+    with transaction.atomic():
+        # Условный сдвиг курсора: если пачку уже учёл другой воркер,
+        # строка не изменится и приращения не запишутся
+        moved = RollupCursor.objects.filter(
+            pk=cursor.pk, last_id=cursor.last_id
+        ).update(last_id=last_id)
+        if not moved:
+            return 0
+        add_counts(GroupActivity, 'group_id', source, group_deltas)
+        add_counts(AuthorActivity, 'author_id', source, author_deltas)
+    return counted
+
+
+def roll_up(until=None, progress=None):
+    """Учитывает все новые строки всех источников пачками.
+
+    progress(source, rows) вызывается после каждой пачки.
+    """
+    total = 0
+    for source in SOURCES:
+        while True:
+            rows = roll_chunk(source, until)
+            total += rows
+            if progress is not None and rows:
+                progress(source, rows)
+            if rows < CHUNK_SIZE:
+                break
+    return total
+
+
+def pending():
+    """Остались ли неучтённые строки, например ещё не устоявшиеся."""
+    cursors = dict(RollupCursor.objects.values_list('source', 'last_id'))
+    return any(
+        model.objects.filter(id__gt=cursors.get(source, 0)).exists()
+        for source, (model, *_) in SOURCES.items()
+    )
+
+
+def reset():
+    """Удаляет сводки и курсоры перед пересчётом истории."""
+    with transaction.atomic():
+        GroupActivity.objects.all().delete()
+        AuthorActivity.objects.all().delete()
+        RollupCursor.objects.all().delete()
+
+
+def chart(rollups, period, counters, now=None):
+    """Точки графика за последние CHART_LENGTH[period] периодов.
+
+    Пропущенные периоды (без событий строк в сводке нет) заполняются
+    нулями. Возвращает точки и максимум для масштаба столбцов.
+    """
+    length = CHART_LENGTH[period]
+    step = timedelta(hours=1 if period == Activity.HOUR else 24)
+    last = truncate(now or timezone.now(), period)
+    first = last - step * (length - 1)
+    stored = {
+        row['start']: row
+        for row in rollups.filter(
+            period=period, start__gte=first
+        ).values('start', *counters)
+    }
+    points = []
+    peak = 0
+    for index in range(length):
+        start = first + step * index
+        row = stored.get(start, {})
+        point = {'start': start}
+        for counter in counters:
+            point[counter] = row.get(counter, 0)
+            peak = max(peak, point[counter])
+        points.append(point)
+    return points, peak
@@ -0,0 +1,24 @@
+from core.jobs import enqueue_unique, task
+
+from . import rollups
+
+# Запуск с задержкой больше SETTLE_DELAY: к этому времени события,
+# из-за которых задача поставлена, уже можно учитывать
+ROLLUP_DELAY = rollups.SETTLE_DELAY * 2
+
+
+@task(priority=-5)
+def roll_up_activity():
+    """Дописывает в сводки активности новые посты, комментарии и подписки.
+
+    Если пересчёт остановился на неустоявшихся строках, задача ставит
+    себя снова: без новых записей на сайте их бы никто не учёл.
+    """
+    rollups.roll_up()
+    if rollups.pending():
+        schedule_rollup()
+
+
+def schedule_rollup():
+    """Ставит пересчёт сводок, если он ещё не запланирован."""
+    enqueue_unique(roll_up_activity, delay=ROLLUP_DELAY)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.jobs import work
+from core.models import Job
+from posts.models import Comment, Follow, Group, Post
+
+from . import rollups, tasks
+from .models import Activity, AuthorActivity, GroupActivity
+
+User = get_user_model()
+
+
+class ActivityRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.author, text='Пост', group=group)
+            for group in (cls.group, cls.group, None)
+        ]
+        Comment.objects.create(
+            author=cls.reader, post=cls.posts[0], text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.later = timezone.now() + timedelta(hours=1)
+
+    def counts(self, period=Activity.DAY):
+        group = GroupActivity.objects.get(group=self.group, period=period)
+        author = AuthorActivity.objects.get(author=self.author, period=period)
+        return (
+            (group.posts, group.comments),
+            (author.posts, author.comments, author.follows),
+        )
+
+    def test_rows_counted_once(self):
+        """Каждая строка попадает в часовые и суточные сводки один раз"""
+        self.assertEqual(rollups.roll_up(self.later), 5)
+        self.assertEqual(rollups.roll_up(self.later), 0)
+        self.assertEqual(self.counts(), ((2, 1), (3, 1, 1)))
+        self.assertEqual(self.counts(Activity.HOUR), ((2, 1), (3, 1, 1)))
+        Post.objects.create(author=self.author, text='Ещё', group=self.group)
+        rollups.roll_up(self.later)
+        self.assertEqual(self.counts(), ((3, 1), (4, 1, 1)))
+
+    def test_unsettled_rows_wait(self):
+        """Свежие строки ждут, пока их транзакции точно зафиксированы"""
+        self.assertEqual(rollups.roll_up(), 0)
+        self.assertFalse(AuthorActivity.objects.exists())
+
+    def test_backfill_in_chunks(self):
+        """Команда пересчитывает историю пачками с тем же результатом"""
+        rollups.roll_up(self.later)
+        out = StringIO()
+        with mock.patch.object(rollups, 'CHUNK_SIZE', 2), \
+                mock.patch.object(rollups, 'SETTLE_DELAY', -3600):
+            call_command('backfill_activity', '--reset', stdout=out)
+        self.assertIn('posts: +2\nposts: +1\n', out.getvalue())
+        self.assertEqual(self.counts(), ((2, 1), (3, 1, 1)))
+
+    def test_chart_reads_rollups(self):
+        """График строится по сводкам и дополняется нулями"""
+        rollups.roll_up(self.later)
+        url = reverse('activity:group', args=(self.group.slug,))
+        response = Client().get(url, {'period': 'hour'})
+        rows = response.context['rows']
+        self.assertEqual(len(rows), rollups.CHART_LENGTH[Activity.HOUR])
+        self.assertEqual(rows[-1][1], [2, 1])
+        self.assertEqual(rows[0][1], [0, 0])
+        response = Client().get(
+            reverse('activity:author', args=(self.author.username,))
+        )
+        self.assertEqual(response.context['rows'][-1][1], [3, 1, 1])
+
+    def test_writes_schedule_one_job(self):
+        """Сколько бы ни было событий, в очереди одна задача сводок"""
+        client = Client()
+        client.force_login(self.author)
+        for text in ('Первый', 'Второй'):
+            client.post(reverse('posts:post_create'), {'text': text})
+        jobs = Job.objects.filter(name=tasks.roll_up_activity.job_name)
+        self.assertEqual(jobs.count(), 1)
+
+    def test_job_waits_for_unsettled_rows(self):
+        """Задача ставит себя снова, пока остаются неустоявшиеся строки"""
+        rollups.roll_up(self.later)
+        Post.objects.create(author=self.author, text='Свежий')
+        tasks.schedule_rollup()
+        jobs = Job.objects.filter(
+            name=tasks.roll_up_activity.job_name, status=Job.QUEUED
+        )
+        jobs.update(run_at=timezone.now())
+        start = timezone.now()
+        self.assertTrue(work('worker'))
+        follow_up = jobs.get()
+        self.assertGreaterEqual(
+            follow_up.run_at,
+            start + timedelta(seconds=tasks.ROLLUP_DELAY)
+        )
+        follow_up.delete()
+        with mock.patch.object(rollups, 'SETTLE_DELAY', -3600):
+            tasks.schedule_rollup()
+            jobs.update(run_at=timezone.now())
+            self.assertTrue(work('worker'))
+        self.assertFalse(jobs.exists())
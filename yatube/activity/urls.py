@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'activity'
+
+urlpatterns = [
+    path('group/<slug:slug>/', views.group_activity, name='group'),
+    path('profile/<str:username>/', views.author_activity, name='author'),
+]
@@ -0,0 +1,50 @@
+from django.shortcuts import render
+
+from posts import lookups
+
+from . import rollups
+from .models import Activity, AuthorActivity, GroupActivity
+
+
+def get_period(request):
+    period = request.GET.get('period')
+    return period if period in rollups.CHART_LENGTH else Activity.DAY
+
+
+def render_chart(request, rollup, counters, context):
+    """Страница с графиком; данные берутся только из сводок."""
+    period = get_period(request)
+    points, peak = rollups.chart(rollup, period, counters)
+    context.update({
+        'period': period,
+        'labels': [
+            rollup.model._meta.get_field(counter).verbose_name
+            for counter in counters
+        ],
+        'rows': [
+            (point['start'], [point[counter] for counter in counters])
+            for point in points
+        ],
+        'peak': peak,
+    })
+    return render(request, 'activity/activity.html', context)
+
+
+def group_activity(request, slug):
+    group = lookups.groups.get_or_404(slug)
+    return render_chart(
+        request,
+        GroupActivity.objects.filter(group_id=group.pk),
+        ('posts', 'comments'),
+        {'group': group},
+    )
+
+
+def author_activity(request, username):
+    author = lookups.authors.get_or_404(username)
+    return render_chart(
+        request,
+        AuthorActivity.objects.filter(author_id=author.pk),
+        ('posts', 'comments', 'follows'),
+        {'author': author},
+    )
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Регистрируем фоновые задачи из tasks.py всех приложений
+        autodiscover_modules('tasks')
+        from . import checks  # noqa: F401
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Кеши, которые видит только свой процесс
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache(app_configs, **kwargs):
+    """Требует общий для всех процессов кеш в боевой конфигурации.
+
+    В кеше живут пользователи сессий, вёдра лимитов и версии лент:
+    сброс в одном воркере должен быть виден остальным.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in LOCAL_CACHES:
+        return []
+    return [Error(
+        f'Кеш {backend} не общий для процессов сервера',
+        hint=(
+            'Задайте CACHE_BACKEND и CACHE_LOCATION, например memcached '
+            'или django.core.cache.backends.db.DatabaseCache'
+        ),
+        id='core.E001',
+    )]
@@ -0,0 +1,218 @@
+"""Фоновая очередь задач в базе данных.
+
+Задачи объявляются декоратором @task в модулях tasks.py приложений
+и ставятся в очередь через enqueue(). Выполняет их команда
+manage.py runworker; воркеров можно запускать сколько угодно:
+задача захватывается условным UPDATE, поэтому достаётся одному.
+"""
+import json
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (Avg, Count, DurationField, ExpressionWrapper,
+                              F, Max)
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед повтором: BACKOFF_BASE * 2 ** (попытка - 1) секунд
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60 * 60
+# Через сколько секунд задачу зависшего воркера можно перезапустить
+LOCK_TIMEOUT = 60 * 10
+# Сколько кандидатов воркер читает за один опрос
+CLAIM_BATCH = 10
+
+_registry = {}
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=5):
+    """Регистрирует функцию как фоновую задачу.
+
+    Аргументы задачи должны сериализоваться в JSON.
+    """
+    def decorator(func):
+        func.job_name = name or f'{func.__module__}.{func.__qualname__}'
+        func.job_priority = priority
+        func.job_max_attempts = max_attempts
+        _registry[func.job_name] = func
+        return func
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def enqueue(func, *args, priority=None, delay=0, **kwargs):
+    """Ставит задачу в очередь и возвращает Job.
+
+    Строка пишется в текущей транзакции: внутри transaction.atomic()
+    задача фиксируется вместе с данными. ATOMIC_REQUESTS не включён,
+    поэтому в обычном виде строка сохраняется сразу - задачу ставят
+    после записи данных, которые ей нужны.
+    """
+    return _create(func, args, kwargs, priority, delay)
+
+
+def _create(func, args, kwargs, priority=None, delay=0, unique_key=None):
+    return Job.objects.create(
+        name=func.job_name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        priority=func.job_priority if priority is None else priority,
+        max_attempts=func.job_max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        unique_key=unique_key,
+    )
+
+
+def enqueue_unique(func, *, delay=0):
+    """Ставит задачу без аргументов, если она ещё не ждёт в очереди.
+
+    Для пакетных задач: сколько бы событий ни пришло до запуска,
+    все они будут обработаны одним выполнением. Проверка только
+    экономит запись: две копии не даёт поставить уникальный unique_key.
+    """
+    pending = Job.objects.filter(name=func.job_name, status=Job.QUEUED)
+    if pending.exists():
+        return None
+    try:
+        with transaction.atomic():
+            return _create(
+                func, (), {}, delay=delay, unique_key=func.job_name
+            )
+    except IntegrityError:
+        # Параллельный вызов успел поставить задачу первым
+        return None
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker):
+    """Захватывает одну готовую к запуску задачу или возвращает None."""
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).order_by('-priority', 'run_at').values_list('pk', flat=True)
+    for pk in candidates[:CLAIM_BATCH]:
+        # Условный UPDATE атомарен: из конкурирующих воркеров
+        # строку изменит только один
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            locked_by=worker,
+            started=now,
+            attempts=F('attempts') + 1,
+            # Задача больше не ждёт: enqueue_unique может ставить новую
+            unique_key=None,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run(job):
+    """Выполняет захваченную задачу и записывает результат."""
+    run_at = job.run_at
+    last_error = ''
+    try:
+        func = _registry[job.name]
+        payload = json.loads(job.payload)
+        func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            status = Job.QUEUED
+            run_at = timezone.now() + timedelta(
+                seconds=backoff(job.attempts)
+            )
+            logger.warning('Задача %s упала, повтор в %s', job, run_at)
+        else:
+            status = Job.FAILED
+            logger.error('Задача %s упала окончательно', job)
+    else:
+        status = Job.DONE
+    # Только пока задача за этим воркером: после requeue_stale() её
+    # состоянием распоряжается другой воркер
+    finished = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by
+    ).update(
+        status=status,
+        run_at=run_at,
+        finished=timezone.now(),
+        locked_by='',
+        last_error=last_error or job.last_error,
+    )
+    if not finished:
+        logger.warning('Задачу %s забрали у воркера %s', job, job.locked_by)
+    job.refresh_from_db()
+    return job
+
+
+def work(worker=None):
+    """Выполняет одну задачу; возвращает False, если очередь пуста."""
+    job = claim(worker or worker_name())
+    if job is None:
+        return False
+    run(job)
+    return True
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, которые не завершились.
+
+    Задача, исчерпавшая попытки, помечается ошибкой: если она сама
+    роняет воркер (например, по памяти), то не будет ходить по кругу.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started__lt=now - timedelta(seconds=LOCK_TIMEOUT),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        locked_by='',
+        finished=now,
+        last_error='Воркер не завершил задачу',
+    )
+    return stale.update(status=Job.QUEUED, locked_by='', run_at=now)
+
+
+def purge(now=None):
+    """Удаляет выполненные и упавшие задачи старше JOB_RETENTION секунд."""
+    now = now or timezone.now()
+    deleted, _ = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished__lt=now - timedelta(seconds=settings.JOB_RETENTION),
+    ).delete()
+    return deleted
+
+
+def metrics(since=None):
+    """Задержка в очереди и время выполнения по именам задач."""
+    jobs = Job.objects.filter(status=Job.DONE)
+    if since is not None:
+        jobs = jobs.filter(finished__gte=since)
+    # От назначенного времени: задержка delay - не ожидание в очереди
+    wait = ExpressionWrapper(
+        F('started') - F('run_at'), output_field=DurationField()
+    )
+    run_time = ExpressionWrapper(
+        F('finished') - F('started'), output_field=DurationField()
+    )
+    return jobs.values('name').annotate(
+        total=Count('pk'),
+        avg_wait=Avg(wait),
+        max_wait=Max(wait),
+        avg_run=Avg(run_time),
+    ).order_by('name')
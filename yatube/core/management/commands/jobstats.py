@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Показывает состояние очереди и задержки фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=24,
+            help='За сколько последних часов считать задержки'
+        )
+
+    def handle(self, *args, **options):
+        statuses = Job.objects.values('status').annotate(total=Count('pk'))
+        for row in statuses.order_by('status'):
+            self.stdout.write(f'{row["status"]:<10} {row["total"]}')
+        since = timezone.now() - timedelta(hours=options['hours'])
+        for row in jobs.metrics(since):
+            self.stdout.write(
+                f'{row["name"]}: {row["total"]} выполнено, '
+                f'ожидание ср. {row["avg_wait"]} макс. {row["max_wait"]}, '
+                f'выполнение ср. {row["avg_run"]}'
+            )
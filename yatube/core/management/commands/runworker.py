@@ -0,0 +1,55 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+# Как часто воркер возвращает в очередь задачи упавших воркеров
+REQUEUE_INTERVAL = 60
+# Как часто воркер удаляет старые выполненные задачи
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди. '
+        'Можно запускать несколько процессов одновременно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда очередь опустеет'
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker = jobs.worker_name()
+        self.stdout.write(f'Воркер {worker} запущен')
+        requeued_at = purged_at = 0
+        while self.running:
+            if time.monotonic() - requeued_at > REQUEUE_INTERVAL:
+                jobs.requeue_stale()
+                requeued_at = time.monotonic()
+            if time.monotonic() - purged_at > PURGE_INTERVAL:
+                jobs.purge()
+                purged_at = time.monotonic()
+            close_old_connections()
+            if jobs.work(worker):
+                continue
+            if options['burst']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Воркер {worker} остановлен')
+
+    def stop(self, signum, frame):
+        # Текущая задача доработает, новые браться не будут
+        self.running = False
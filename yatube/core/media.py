@@ -0,0 +1,164 @@
+"""Раздача медиафайлов через фронтовой сервер.
+
+Вид проверяет путь и наличие файла, отвечает на условные запросы и
+ставит заголовки кеша, а сами байты отдаёт фронтовой сервер по
+X-Accel-Redirect (nginx) или X-Sendfile (Apache, lighttpd): воркер
+Python не занят передачей картинок. Файлы с хешем в имени (картинки
+из posts.storage и миниатюры sorl.thumbnail) никогда не меняются,
+поэтому кешируются браузером на год как immutable.
+
+Без MEDIA_SENDFILE файл отдаёт сам Django с поддержкой Range - для
+разработки и тестов.
+
+Пример для nginx:
+    location /protected-media/ {
+        internal;
+        alias /path/to/media/;
+    }
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotAllowed, StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+# Каталоги MEDIA_ROOT, которые можно отдавать
+MEDIA_DIRECTORIES = (
+    'posts/', 'resized/', thumbnail_settings.THUMBNAIL_PREFIX
+)
+# sha256 картинок и кадров core.resize или md5 миниатюр
+HASHED_NAME = re.compile(r'[0-9a-f]{32}(?:[0-9a-f]{32})?\.\w+')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE = 'public, max-age=3600'
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+CHUNK_SIZE = 64 * 1024
+
+
+def media_path(path):
+    """Путь к файлу в MEDIA_ROOT или Http404."""
+    name = os.path.basename(path)
+    # Каталог проверяется у пути без «..» и повторных «/»: иначе
+    # posts/../cache/... прошёл бы проверку и вышел из posts/
+    if posixpath.normpath(path) != path \
+            or not path.startswith(MEDIA_DIRECTORIES) \
+            or name.startswith('.') or name.endswith('.tmp'):
+        # Временные файлы - это загрузки, которые ещё пишутся
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        file_stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    return full_path, file_stat
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) единственного диапазона.
+
+    None - заголовка нет или он не поддерживается, тогда отдаётся весь
+    файл; ValueError - диапазон за пределами файла.
+    """
+    match = RANGE.fullmatch(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500: последние 500 байт
+        length = int(end)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        left = end - start + 1
+        while left:
+            chunk = file.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                return
+            left -= len(chunk)
+            yield chunk
+
+
+def local_response(request, full_path, size, etag):
+    """Ответ самого Django: весь файл или один диапазон."""
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(full_path, start, end), status=206
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            return response
+    return FileResponse(open(full_path, 'rb'))
+
+
+def serve(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    full_path, file_stat = media_path(path)
+    etag = f'"{file_stat.st_size:x}-{int(file_stat.st_mtime):x}"'
+    last_modified = int(file_stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        sendfile = settings.MEDIA_SENDFILE
+        if sendfile == 'x-accel-redirect':
+            # Range и Content-Length nginx обработает сам
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_PREFIX + path
+            )
+        elif sendfile == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = full_path
+        else:
+            response = local_response(
+                request, full_path, file_stat.st_size, etag
+            )
+            response['Accept-Ranges'] = 'bytes'
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(last_modified)
+    response['ETag'] = etag
+    if HASHED_NAME.fullmatch(os.path.basename(path)):
+        response['Cache-Control'] = IMMUTABLE_CACHE
+    else:
+        response['Cache-Control'] = MUTABLE_CACHE
+    return response
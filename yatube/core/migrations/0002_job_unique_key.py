@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='unique_key',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True, unique=True, verbose_name='Ключ уникальности'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import models
+
+
+class Job(models.Model):
+    """Отложенная задача фоновой очереди в базе данных."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы в JSON', default='{}')
+    priority = models.SmallIntegerField(
+        'Приоритет',
+        default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток',
+        default=5
+    )
+    run_at = models.DateTimeField('Запустить не раньше')
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    # Имя задачи, пока она ждёт в очереди единственной копией
+    # (enqueue_unique): уникальный индекс не даст параллельным вызовам
+    # поставить вторую. При захвате ключ снимается
+    unique_key = models.CharField(
+        'Ключ уникальности',
+        max_length=200,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='core_job_claim_idx'
+            ),
+        ]
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    @property
+    def wait_time(self):
+        """Сколько задача ждала запуска после назначенного времени."""
+        if self.started is None:
+            return None
+        return self.started - self.run_at
+
+    @property
+    def run_time(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
@@ -0,0 +1,162 @@
+"""Ограничение частоты запросов алгоритмом token bucket.
+
+У каждого ключа (вид плюс пользователь или IP) есть ведро на capacity
+жетонов, которое наполняется со скоростью capacity за period секунд.
+Запрос забирает по жетону из всех своих вёдер, а пустое ведро означает
+ответ 429 ещё до разбора формы и обращений к базе; тогда жетоны не
+тратятся ни в одном ведре. Ведро (жетоны, время) хранится
+в кеше, а чтение и запись защищены блокировкой на cache.add, который
+атомарен и между процессами в memcached, redis и кеше в базе.
+Лимит общий для всех воркеров только с общим кешем, поэтому
+check --deploy не пропускает LocMemCache (core.checks). Адрес клиента
+за прокси берётся из заголовка settings.CLIENT_IP_HEADER.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+# Блокировка ведра живёт не дольше секунды, даже если процесс упал
+LOCK_TIMEOUT = 1
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60): ёмкость ведра и период наполнения."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def lock(key):
+    """Захватывает блокировку ведра key; False - не дождались."""
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+            return True
+        time.sleep(LOCK_WAIT)
+    return False
+
+
+def unlock(key):
+    cache.delete(f'{key}:lock')
+
+
+class TokenBucket:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def tokens(self, key, now):
+        """Жетоны в ведре к моменту now с учётом наполнения."""
+        tokens, updated = cache.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def wait(self, tokens):
+        """Сколько секунд ждать жетона при tokens в ведре."""
+        return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def store(self, key, tokens, now):
+        # За period пустое ведро наполняется целиком, дольше хранить
+        # его незачем
+        cache.set(key, (tokens, now), math.ceil(self.period))
+
+    def take(self, key, now=None):
+        """Забирает жетон; возвращает 0 или сколько секунд ждать."""
+        return take_all([(self, key)], now)
+
+
+def take_all(buckets, now=None):
+    """Забирает по жетону из каждого ведра списка (bucket, key).
+
+    Жетоны берутся, только если их хватает во всех вёдрах: запрос,
+    отклонённый одним лимитом, не тратит остальные. Возвращает 0 или
+    сколько секунд ждать самого пустого ведра.
+    """
+    # Вёдра блокируются в одном порядке, чтобы запросы с общими
+    # ключами не ждали друг друга по кругу
+    buckets = sorted(buckets, key=lambda item: item[1])
+    locked = []
+    try:
+        for _, key in buckets:
+            if not lock(key):
+                # Ведро долго занято: отказ здесь ударил бы по запросу,
+                # у которого жетоны есть, поэтому пропускаем его, не
+                # трогая вёдра
+                return 0
+            locked.append(key)
+        if now is None:
+            now = time.time()
+        tokens = [bucket.tokens(key, now) for bucket, key in buckets]
+        wait = max(
+            bucket.wait(left) for (bucket, _), left in zip(buckets, tokens)
+        )
+        if wait:
+            return wait
+        for (bucket, key), left in zip(buckets, tokens):
+            bucket.store(key, left - 1, now)
+        return 0
+    finally:
+        for key in locked:
+            unlock(key)
+
+
+def client_ip(request):
+    """Адрес клиента: от доверенного прокси или адрес соединения.
+
+    В X-Forwarded-For клиент может вписать что угодно, а последний
+    адрес добавляет сам прокси, поэтому берётся он.
+    """
+    header = settings.CLIENT_IP_HEADER
+    if header:
+        forwarded = request.META.get(header, '').split(',')[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(name, request):
+    """Проверяет лимиты вида name; возвращает, сколько секунд ждать."""
+    limits = settings.RATE_LIMITS.get(name, {})
+    keys = {'ip': client_ip(request)}
+    if request.user.is_authenticated:
+        keys['user'] = request.user.pk
+    buckets = [
+        (
+            TokenBucket(*parse_rate(rate)),
+            f'ratelimit:{name}:{kind}:{keys[kind]}',
+        )
+        for kind, rate in limits.items()
+        if kind in keys
+    ]
+    if not buckets:
+        return 0
+    return take_all(buckets)
+
+
+def rate_limit(name, methods=('POST',)):
+    """Ограничивает вид лимитами settings.RATE_LIMITS[name].
+
+    methods - какие запросы считать; None - все.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                wait = check(name, request)
+                if wait:
+                    # Без контекста запроса: отказ не трогает ни сессию,
+                    # ни базу
+                    response = HttpResponse(
+                        render_to_string('core/429.html'), status=429
+                    )
+                    response['Retry-After'] = math.ceil(wait)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,307 @@
+"""Картинки нужного размера по подписанной ссылке.
+
+Ссылку строит resize_url(): ширина, высота и способ кадрирования
+подписаны ключом сайта, так что посторонний не закажет тысячи размеров.
+Первый запрос строит кадр в пуле из RESIZE_WORKERS процессов и кладёт
+его в MEDIA_ROOT/resized/ под именем-хешем; дальше файл отдаёт
+core.media, то есть фронтовой сервер. Одновременные запросы одного
+кадра, в том числе из разных процессов, ждут того, кто его строит:
+блокировка - файл рядом с кадром, созданный с O_EXCL. Очередь к пулу
+ограничена, лишние запросы сразу получают 503. Каталог кадров
+ограничен RESIZE_CACHE_SIZE байт: объём считается по диску, при
+переполнении удаляются давно не запрошенные файлы.
+"""
+import hashlib
+import multiprocessing
+import os
+import posixpath
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from PIL import Image, ImageOps
+
+from . import media
+
+RESIZED_DIRECTORY = 'resized/'
+CROPS = ('center', 'fit')
+MAX_SIDE = 2000
+QUALITY = 85
+# Сколько ждать кадр, который строит другой запрос
+RENDER_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+# Блокировку старше считаем брошенной упавшим процессом
+LOCK_TIMEOUT = 60 * 5
+# Время доступа обновляется не чаще, чтобы попадания не писали на диск
+TOUCH_INTERVAL = 60 * 60
+# После переполнения каталог чистится до этой доли от предела
+EVICT_TO = 0.9
+# Как часто процесс пересчитывает объём каталога по диску
+RECOUNT_INTERVAL = 60
+EVICT_LOCK = '.evict.lock'
+
+signer = signing.Signer(salt='core.resize')
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+# (байты, время подсчёта): свои кадры добавляются, чужие - при пересчёте
+_size = None
+_size_lock = threading.Lock()
+
+
+def variant_value(path, width, height, crop):
+    return f'{path}:{width}:{height}:{crop}'
+
+
+def resize_url(path, width, height, crop='center'):
+    """Подписанная ссылка на кадр картинки path из MEDIA_ROOT."""
+    signature = signer.signature(variant_value(path, width, height, crop))
+    query = urlencode(
+        {'w': width, 'h': height, 'crop': crop, 's': signature}
+    )
+    return f'{reverse("resize", args=(path,))}?{query}'
+
+
+def variant_name(path, width, height, crop):
+    """Имя кадра в MEDIA_ROOT; прозрачные форматы остаются PNG."""
+    digest = hashlib.sha256(
+        variant_value(path, width, height, crop).encode()
+    ).hexdigest()
+    ext = '.png' if path.lower().endswith(('.png', '.gif')) else '.jpg'
+    return posixpath.join(
+        RESIZED_DIRECTORY, digest[:2], digest[2:4], digest + ext
+    )
+
+
+def render(source, target, width, height, crop):
+    """Строит кадр; выполняется в процессе пула."""
+    with Image.open(source) as image:
+        if target.endswith('.jpg'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        if crop == 'center':
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image.thumbnail((width, height), Image.LANCZOS)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(target), suffix='.tmp'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                image.save(
+                    temp, 'JPEG' if target.endswith('.jpg') else 'PNG',
+                    quality=QUALITY, optimize=True
+                )
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    return os.path.getsize(target)
+
+
+def pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            # spawn: fork многопоточного процесса сервера может зависнуть
+            _pool = ProcessPoolExecutor(
+                settings.RESIZE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            # Очередь к пулу тоже ограничена: лишним запросам - 503
+            _slots = threading.BoundedSemaphore(settings.RESIZE_WORKERS * 4)
+        return _pool, _slots
+
+
+def lock(path):
+    """Файловая блокировка; True - её взял этот вызов."""
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                age = time.time() - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age < LOCK_TIMEOUT:
+                return False
+            unlock(path)
+    return False
+
+
+def unlock(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def lock_name(target):
+    # Скрытый файл: core.media его не отдаёт, evict() не считает
+    directory, name = os.path.split(target)
+    return os.path.join(directory, f'.{name}.lock')
+
+
+def build(source, target, width, height, crop, lock_path):
+    """Строит кадр в пуле; False - пул перегружен или не успел.
+
+    Слот пула и блокировка освобождаются, когда кадр действительно
+    построен, а не когда запрос перестал ждать.
+    """
+    executor, slots = pool()
+    if not slots.acquire(blocking=False):
+        unlock(lock_path)
+        return False
+
+    def done(future):
+        slots.release()
+        unlock(lock_path)
+
+    try:
+        future = executor.submit(render, source, target, width, height, crop)
+    except BaseException:
+        done(None)
+        raise
+    future.add_done_callback(done)
+    try:
+        size = future.result(timeout=RENDER_TIMEOUT)
+    except FutureTimeout:
+        return False
+    add_size(size)
+    return True
+
+
+def wait_for(target):
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    while time.monotonic() < deadline:
+        if os.path.exists(target):
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+
+def ensure(name, source, width, height, crop):
+    """Кадр на диске; собирает одновременные запросы в одну сборку."""
+    target = os.path.join(settings.MEDIA_ROOT, name)
+    if os.path.exists(target):
+        touch(target)
+        return True
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    lock_path = lock_name(target)
+    if not lock(lock_path):
+        return wait_for(target)
+    # Кадр могли достроить между проверкой и блокировкой
+    if os.path.exists(target):
+        unlock(lock_path)
+        return True
+    return build(source, target, width, height, crop, lock_path)
+
+
+def touch(path):
+    now = time.time()
+    if now - os.stat(path).st_mtime > TOUCH_INTERVAL:
+        os.utime(path, (now, now))
+
+
+def root():
+    return os.path.join(settings.MEDIA_ROOT, RESIZED_DIRECTORY)
+
+
+def cache_files():
+    for directory, _, names in os.walk(root()):
+        for name in names:
+            if name.startswith('.') or name.endswith('.tmp'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                file_stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield file_stat.st_mtime, file_stat.st_size, path
+
+
+def add_size(size):
+    """Учитывает новый кадр и чистит каталог при переполнении."""
+    global _size
+    now = time.monotonic()
+    with _size_lock:
+        if _size is None or now - _size[1] > RECOUNT_INTERVAL:
+            # Пересчёт по диску видит и кадры соседних процессов
+            _size = (sum(size for _, size, _ in cache_files()), now)
+        else:
+            _size = (_size[0] + size, _size[1])
+        total = _size[0]
+    if total <= settings.RESIZE_CACHE_SIZE:
+        return
+    lock_path = os.path.join(root(), EVICT_LOCK)
+    if lock(lock_path):
+        try:
+            total = evict()
+        finally:
+            unlock(lock_path)
+        with _size_lock:
+            _size = (total, time.monotonic())
+
+
+def evict():
+    """Удаляет самые старые по времени доступа кадры."""
+    files = sorted(cache_files())
+    total = sum(size for _, size, _ in files)
+    limit = settings.RESIZE_CACHE_SIZE * EVICT_TO
+    for _, size, path in files:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def parse(request):
+    """Проверенные ширина, высота и кадрирование из запроса или Http404."""
+    try:
+        width = int(request.GET['w'])
+        height = int(request.GET['h'])
+        crop = request.GET.get('crop', 'center')
+        signature = request.GET['s']
+    except (KeyError, ValueError):
+        raise Http404
+    if not (0 < width <= MAX_SIDE and 0 < height <= MAX_SIDE) \
+            or crop not in CROPS:
+        raise Http404
+    return width, height, crop, signature
+
+
+def serve(request, path):
+    width, height, crop, signature = parse(request)
+    expected = signer.signature(variant_value(path, width, height, crop))
+    if not constant_time_compare(signature, expected):
+        raise Http404
+    if path.startswith(RESIZED_DIRECTORY):
+        raise Http404
+    source, _ = media.media_path(path)
+    name = variant_name(path, width, height, crop)
+    try:
+        ready = ensure(name, source, width, height, crop)
+    except (OSError, Image.DecompressionBombError):
+        # Файл не картинка, повреждён или слишком велик для распаковки
+        raise Http404
+    if not ready:
+        response = HttpResponse('Картинка ещё готовится', status=503)
+        response['Retry-After'] = 1
+        return response
+    return media.serve(request, name)
@@ -0,0 +1,14 @@
+from django import template
+
+from .. import resize
+
+register = template.Library()
+
+
+@register.simple_tag
+def resized(image, width, height, crop='center'):
+    """Подписанная ссылка на кадр картинки; '' для пустой картинки."""
+    name = getattr(image, 'name', image)
+    if not name:
+        return ''
+    return resize.resize_url(name, width, height, crop)
@@ -0,0 +1,571 @@
+import io
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts import counters
+from posts.models import Comment, Post
+
+from . import checks, jobs, media, ratelimit, resize, thumbnails
+from .models import Job
+
+calls = []
+
+
+@jobs.task(name='core.tests.record', priority=1, max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(name='core.tests.broken', max_attempts=2)
+def broken():
+    raise ValueError('ошибка')
+
+
+@jobs.task(name='core.tests.tick')
+def tick():
+    calls.append('tick')
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_local_cache_refused(self):
+        """check --deploy не пропускает кеш одного процесса"""
+        errors = checks.shared_cache(None)
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache',
+        }}
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.shared_cache(None), [])
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_by_priority(self):
+        """Задачи выполняются по приоритету и помечаются выполненными"""
+        jobs.enqueue(record, 'low', priority=0)
+        jobs.enqueue(record, 'high', priority=5)
+        while jobs.work('test'):
+            pass
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(
+            Job.objects.filter(status=Job.DONE).count(), 2
+        )
+        self.assertEqual(list(jobs.metrics())[0]['total'], 2)
+
+    def test_delayed_job_not_claimed(self):
+        """Отложенная задача не берётся раньше времени"""
+        jobs.enqueue(record, 'later', delay=60)
+        self.assertFalse(jobs.work('test'))
+
+    def test_failed_job_retried_with_backoff(self):
+        """Упавшая задача повторяется с задержкой, затем помечается ошибкой"""
+        job = jobs.enqueue(broken)
+        self.assertTrue(jobs.work('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertTrue(jobs.work('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_claimed_job_not_claimed_twice(self):
+        """Захваченную задачу не получит другой воркер"""
+        jobs.enqueue(record, 'once')
+        self.assertIsNotNone(jobs.claim('first'))
+        self.assertIsNone(jobs.claim('second'))
+
+    def test_stale_job_requeued(self):
+        """Задача зависшего воркера возвращается в очередь"""
+        job = jobs.enqueue(record, 'stale')
+        jobs.claim('dead')
+        Job.objects.filter(pk=job.pk).update(
+            started=timezone.now() - timedelta(seconds=jobs.LOCK_TIMEOUT + 1)
+        )
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertTrue(jobs.work('test'))
+        self.assertEqual(calls, ['stale'])
+
+    def test_stale_job_without_attempts_failed(self):
+        """Задача, которая роняет воркер, не перезапускается без конца"""
+        job = jobs.enqueue(record, 'crash')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING,
+            attempts=job.max_attempts,
+            started=timezone.now() - timedelta(seconds=jobs.LOCK_TIMEOUT + 1)
+        )
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_requeued_job_not_finished_by_old_worker(self):
+        """Старый воркер не перезаписывает задачу, отданную другому"""
+        jobs.enqueue(record, 'slow')
+        slow = jobs.claim('slow')
+        Job.objects.filter(pk=slow.pk).update(
+            started=timezone.now() - timedelta(seconds=jobs.LOCK_TIMEOUT + 1)
+        )
+        jobs.requeue_stale()
+        jobs.claim('fresh')
+        jobs.run(slow)
+        slow.refresh_from_db()
+        self.assertEqual(slow.status, Job.RUNNING)
+        self.assertEqual(slow.locked_by, 'fresh')
+
+    def test_unique_job_not_enqueued_twice_concurrently(self):
+        """Параллельные enqueue_unique ставят одну задачу"""
+        # Оба вызова прошли проверку раньше, чем другой записал строку
+        with mock.patch('django.db.models.QuerySet.exists',
+                        return_value=False):
+            self.assertIsNotNone(jobs.enqueue_unique(tick))
+            self.assertIsNone(jobs.enqueue_unique(tick))
+        self.assertEqual(Job.objects.filter(name=tick.job_name).count(), 1)
+        jobs.claim('test')
+        self.assertIsNotNone(jobs.enqueue_unique(tick))
+
+    def test_metrics_wait_from_run_at(self):
+        """Задержка delay не считается ожиданием в очереди"""
+        job = jobs.enqueue(record, 'later', delay=60)
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1),
+            created=timezone.now() - timedelta(hours=1),
+        )
+        self.assertTrue(jobs.work('test'))
+        job.refresh_from_db()
+        self.assertLess(job.wait_time, timedelta(minutes=1))
+        self.assertLess(list(jobs.metrics())[0]['max_wait'],
+                        timedelta(minutes=1))
+
+    def test_old_finished_jobs_purged(self):
+        """Старые выполненные и упавшие задачи удаляются, очередь - нет"""
+        for value in ('old', 'fresh', 'queued'):
+            jobs.enqueue(record, value)
+        jobs.work('test')
+        jobs.work('test')
+        old = timezone.now() - timedelta(seconds=settings.JOB_RETENTION + 1)
+        Job.objects.filter(payload__contains='old').update(
+            finished=old, status=Job.FAILED
+        )
+        self.assertEqual(jobs.purge(), 1)
+        self.assertEqual(
+            sorted(Job.objects.values_list('status', flat=True)),
+            [Job.DONE, Job.QUEUED]
+        )
+
+    def test_password_reset_email_sent_by_worker(self):
+        """Письмо сброса пароля отправляется из очереди"""
+        get_user_model().objects.create_user(
+            username='auth', email='auth@example.com', password='pass-123'
+        )
+        self.client.post(
+            '/auth/password_reset/', {'email': 'auth@example.com'}
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        # В базе очереди нет ни ссылки, ни токена
+        self.assertNotIn('/reset/', Job.objects.get().payload)
+        self.assertTrue(jobs.work('test'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['auth@example.com'])
+        link = re.search(r'/auth/reset/\S+', mail.outbox[0].body).group()
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.endswith('/set-password/'))
+
+
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills_up_to_capacity(self):
+        """Ведро отдаёт capacity жетонов и наполняется со временем"""
+        bucket = ratelimit.TokenBucket(2, 10)
+        self.assertEqual(bucket.take('bucket', now=100), 0)
+        self.assertEqual(bucket.take('bucket', now=100), 0)
+        self.assertAlmostEqual(bucket.take('bucket', now=100), 5)
+        self.assertEqual(bucket.take('bucket', now=105), 0)
+        # После долгого простоя жетонов не больше ёмкости
+        self.assertEqual(bucket.take('bucket', now=1000), 0)
+        self.assertEqual(bucket.take('bucket', now=1000), 0)
+        self.assertGreater(bucket.take('bucket', now=1000), 0)
+
+    @override_settings(RATE_LIMITS={'add_comment': {'user': '2/m'}})
+    def test_over_limit_rejected_before_view(self):
+        """Лишние комментарии получают 429 и не пишутся в базу"""
+        user = get_user_model().objects.create_user(username='spammer')
+        post = Post.objects.create(author=user, text='Пост')
+        client = Client()
+        client.force_login(user)
+        url = reverse('posts:add_comment', args=(post.pk,))
+        statuses = [
+            client.post(url, {'text': 'Спам'}).status_code for _ in range(3)
+        ]
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(client.post(url)['Retry-After'], '30')
+
+    @override_settings(RATE_LIMITS={'follow': {'ip': '1/m'}})
+    def test_limit_per_ip(self):
+        """Лимит по IP общий для разных пользователей"""
+        User = get_user_model()
+        author = User.objects.create_user(username='star')
+        url = reverse('posts:profile_follow', args=(author.username,))
+        statuses = []
+        for name in ('first', 'second'):
+            client = Client()
+            client.force_login(User.objects.create_user(username=name))
+            statuses.append(client.get(url).status_code)
+        self.assertEqual(statuses, [302, 429])
+
+    @override_settings(RATE_LIMITS={'follow': {'user': '2/m', 'ip': '1/m'}})
+    def test_rejected_request_keeps_other_tokens(self):
+        """Отказ по IP не тратит жетоны пользователя"""
+        User = get_user_model()
+        author = User.objects.create_user(username='star')
+        url = reverse('posts:profile_follow', args=(author.username,))
+        client = Client()
+        client.force_login(User.objects.create_user(username='roamer'))
+        statuses = [
+            client.get(url, REMOTE_ADDR=ip).status_code
+            for ip in ('10.0.0.1', '10.0.0.1', '10.0.0.2', '10.0.0.3')
+        ]
+        self.assertEqual(statuses, [302, 429, 302, 429])
+
+    def test_busy_bucket_not_rejected(self):
+        """Занятое другим запросом ведро не превращается в отказ"""
+        bucket = ratelimit.TokenBucket(1, 10)
+        cache.add('busy:lock', 1, ratelimit.LOCK_TIMEOUT)
+        with mock.patch.object(ratelimit, 'LOCK_WAIT', 0):
+            self.assertEqual(bucket.take('busy', now=100), 0)
+        cache.delete('busy:lock')
+        # Пропущенный запрос жетон не потратил
+        self.assertEqual(bucket.take('busy', now=100), 0)
+        self.assertGreater(bucket.take('busy', now=100), 0)
+
+    @override_settings(
+        RATE_LIMITS={'follow': {'ip': '1/m'}},
+        CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR',
+    )
+    def test_client_ip_from_proxy_header(self):
+        """За прокси лимит считается по адресу из доверенного заголовка"""
+        User = get_user_model()
+        author = User.objects.create_user(username='star')
+        url = reverse('posts:profile_follow', args=(author.username,))
+        client = Client()
+        client.force_login(User.objects.create_user(username='proxied'))
+        statuses = [
+            client.get(url, HTTP_X_FORWARDED_FOR=forwarded).status_code
+            for forwarded in ('10.0.0.1', '1.2.3.4, 10.0.0.2', '10.0.0.2')
+        ]
+        self.assertEqual(statuses, [302, 302, 429])
+
+
+class MediaServeTest(TestCase):
+    content = bytes(range(256)) * 4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.hashed = 'posts/ab/cd/' + 'abcd' + '0' * 60 + '.jpg'
+        cls.legacy = 'posts/photo.jpg'
+        for name in (cls.hashed, cls.legacy, 'posts/upload.tmp',
+                     'private/secret.jpg'):
+            path = os.path.join(cls.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        media_root = override_settings(MEDIA_ROOT=self.media_root)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_local_file_and_cache_headers(self):
+        """Файл отдаётся целиком, хешированные имена кешируются навсегда"""
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE)
+        self.assertEqual(
+            self.get(self.legacy)['Cache-Control'], media.MUTABLE_CACHE
+        )
+        not_modified = self.get(
+            self.hashed, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_range_requests(self):
+        """Диапазоны байт: обычный, с конца и за пределами файла"""
+        response = self.get(self.hashed, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(
+            b''.join(response.streaming_content), self.content[10:20]
+        )
+        response = self.get(self.hashed, HTTP_RANGE='bytes=-4')
+        self.assertEqual(
+            b''.join(response.streaming_content), self.content[-4:]
+        )
+        response = self.get(self.hashed, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_forbidden_paths(self):
+        """Чужие каталоги, выход за MEDIA_ROOT и недописанные загрузки"""
+        for name in ('posts/../../manage.py', 'other/file.jpg',
+                     'posts/../private/secret.jpg',
+                     'posts/ab/../../private/secret.jpg',
+                     'posts/upload.tmp', 'posts/missing.jpg', 'posts/ab'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_front_server_headers(self):
+        """С фронтовым сервером вид отдаёт только заголовок"""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.get(self.hashed)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_ACCEL_PREFIX + self.hashed
+        )
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.get(self.hashed)
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(self.media_root, self.hashed)
+        )
+
+
+def png_chunk(kind, body):
+    return (struct.pack('>I', len(body)) + kind + body
+            + struct.pack('>I', zlib.crc32(kind + body)))
+
+
+class ResizeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        os.makedirs(os.path.join(cls.media_root, 'posts'))
+        Image.new('RGB', (100, 50), 'red').save(
+            os.path.join(cls.media_root, 'posts', 'photo.jpg')
+        )
+        with open(os.path.join(cls.media_root, 'posts', 'broken.jpg'),
+                  'wb') as file:
+            file.write(b'not an image')
+        # Заголовок PNG на 20000x10000 точек: больше предела Pillow
+        with open(os.path.join(cls.media_root, 'posts', 'bomb.png'),
+                  'wb') as file:
+            file.write(b'\x89PNG\r\n\x1a\n')
+            file.write(png_chunk(b'IHDR', struct.pack(
+                '>IIBBBBB', 20000, 10000, 8, 0, 0, 0, 0
+            )))
+            file.write(png_chunk(b'IDAT', b''))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
+        cache.clear()
+        shutil.rmtree(
+            os.path.join(self.media_root, resize.RESIZED_DIRECTORY),
+            ignore_errors=True
+        )
+        media_root = override_settings(MEDIA_ROOT=self.media_root)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def test_signed_resize(self):
+        """Кадр строится по подписанной ссылке и потом берётся с диска"""
+        url = resize.resize_url('posts/photo.jpg', 40, 40)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE)
+        image = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (40, 40))
+        with mock.patch.object(resize, 'build') as build:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        build.assert_not_called()
+
+    def test_unsigned_parameters_rejected(self):
+        """Подпись привязана к пути, размерам и кадрированию"""
+        url = resize.resize_url('posts/photo.jpg', 40, 40)
+        for tampered in (url.replace('w=40', 'w=41'),
+                         url.replace('crop=center', 'crop=fit'),
+                         url.replace('photo.jpg', 'other.jpg'),
+                         url.split('&s=')[0]):
+            with self.subTest(url=tampered):
+                self.assertEqual(self.client.get(tampered).status_code, 404)
+
+    def test_bad_source_images_not_found(self):
+        """Не картинка и картинка-бомба дают 404, а не ошибку сервера"""
+        for path in ('posts/broken.jpg', 'posts/bomb.png'):
+            with self.subTest(path=path):
+                response = self.client.get(resize.resize_url(path, 40, 40))
+                self.assertEqual(response.status_code, 404)
+
+    def test_concurrent_requests_build_once(self):
+        """Одновременные запросы одного кадра строят его один раз"""
+        name = resize.variant_name('posts/photo.jpg', 10, 10, 'center')
+        target = os.path.join(self.media_root, name)
+        calls = []
+
+        def slow_build(source, target, *args):
+            calls.append(target)
+            time.sleep(0.2)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            open(target, 'wb').close()
+            return True
+
+        results = []
+        with mock.patch.object(resize, 'build', slow_build):
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    resize.ensure(name, 'source', 10, 10, 'center')
+                ))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(calls, [target])
+        self.assertEqual(results, [True] * 4)
+
+    def test_overloaded_pool_rejected_at_once(self):
+        """Без свободного слота пула запрос сразу получает отказ"""
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        executor = mock.Mock()
+        lock_path = os.path.join(self.media_root, '.busy.lock')
+        open(lock_path, 'wb').close()
+        with mock.patch.object(resize, 'pool', return_value=(executor, slots)):
+            self.assertFalse(
+                resize.build('source', 'target', 10, 10, 'center', lock_path)
+            )
+        executor.submit.assert_not_called()
+        self.assertFalse(os.path.exists(lock_path))
+
+    def test_file_lock_shared_between_processes(self):
+        """Блокировку держит файл; брошенная блокировка перехватывается"""
+        path = os.path.join(self.media_root, '.variant.lock')
+        self.addCleanup(resize.unlock, path)
+        self.assertTrue(resize.lock(path))
+        self.assertFalse(resize.lock(path))
+        abandoned = time.time() - resize.LOCK_TIMEOUT - 1
+        os.utime(path, (abandoned, abandoned))
+        self.assertTrue(resize.lock(path))
+
+    def test_post_page_links_social_preview(self):
+        """Страница поста даёт og:image через подписанную ссылку"""
+        author = get_user_model().objects.create_user(username='painter')
+        post = Post.objects.create(
+            author=author, text='С картинкой', image='posts/photo.jpg'
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        url = resize.resize_url('posts/photo.jpg', 1200, 630)
+        self.assertContains(
+            response,
+            f'<meta property="og:image" content="http://testserver'
+            f'{url.replace("&", "&amp;")}">'
+        )
+
+    @override_settings(RESIZE_CACHE_SIZE=100)
+    def test_least_recently_used_evicted(self):
+        """При переполнении удаляются давно не запрошенные кадры"""
+        root = os.path.join(self.media_root, resize.RESIZED_DIRECTORY)
+        os.makedirs(root)
+        paths = []
+        for age in (3, 2, 1):
+            path = os.path.join(root, f'{age}.jpg')
+            with open(path, 'wb') as file:
+                file.write(b'x' * 40)
+            moment = time.time() - age * 60
+            os.utime(path, (moment, moment))
+            paths.append(path)
+        self.assertEqual(resize.evict(), 80)
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.exists(paths[2]))
+
+
+class ThumbnailStoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = thumbnails.KVStore()
+        self.keys = [add_prefix(f'key{i}') for i in range(3)]
+        KVStoreModel.objects.bulk_create(
+            KVStoreModel(key=key, value=f'value{i}')
+            for i, key in enumerate(self.keys[:2])
+        )
+
+    def test_prefetch_reads_page_in_one_query(self):
+        """Ключи страницы и отсутствующий ключ - один запрос к базе"""
+        with self.assertNumQueries(1):
+            self.store.prefetch(self.keys)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store._get_raw(self.keys[0]), 'value0')
+            self.assertIsNone(self.store._get_raw(self.keys[2]))
+        # Другой процесс найдёт ключи в общем кеше
+        with self.assertNumQueries(0):
+            thumbnails.KVStore().prefetch(self.keys)
+
+    def test_write_and_delete_update_local_cache(self):
+        """Запись и удаление видны в процессе сразу"""
+        self.store.prefetch(self.keys)
+        self.store._set_raw(self.keys[2], 'value2')
+        self.store._delete_raw(self.keys[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.store._get_raw(self.keys[2]), 'value2')
+        self.assertIsNone(self.store._get_raw(self.keys[0]))
+
+    def test_delete_in_other_process_clears_local_cache(self):
+        """Удаление кадра в соседнем процессе сбрасывает LRU этого"""
+        self.store.prefetch(self.keys)
+        other = thumbnails.KVStore()
+        other._delete_raw(self.keys[0])
+        # До проверки поколения процесс ещё помнит старое значение
+        self.assertEqual(self.store._get_raw(self.keys[0]), 'value0')
+        later = time.monotonic() + thumbnails.GENERATION_CHECK_INTERVAL
+        with mock.patch('time.monotonic', return_value=later):
+            self.assertIsNone(self.store._get_raw(self.keys[0]))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.store._get_raw(self.keys[1]), 'value1')
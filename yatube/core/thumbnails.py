@@ -0,0 +1,134 @@
+"""Хранилище ключей sorl.thumbnail с LRU-кешем в памяти процесса.
+
+Стандартное хранилище sorl ходит в кеш (а при промахе в базу) за
+каждым кадром: лента из десяти постов с вариантами для srcset - это
+десятки обращений. Здесь перед общим кешем и базой стоит LRU процесса,
+а prefetch() загружает ключи всей страницы разом: один get_many к кешу
+и один запрос к базе на промахи. Отсутствие ключа тоже запоминается.
+
+В LRU попадают только описания кадров (ключи image). Списки кадров
+картинки sorl переписывает чтением и записью, поэтому они всегда
+читаются из общего хранилища. Запись и удаление сбрасывают LRU своего
+процесса. Удаление кадров ещё и меняет поколение в общем кеше: соседние
+процессы сверяют его не чаще раза в GENERATION_CHECK_INTERVAL и при
+смене очищают свой LRU, чтобы не отдавать адреса удалённых кадров.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+IMAGE_PREFIX = add_prefix('', 'image')
+LOCAL_SIZE = 4096
+LOCAL_TIMEOUT = 60 * 10
+# Кадр, которого ещё нет, может построить соседний процесс
+LOCAL_MISSING_TIMEOUT = 10
+GENERATION_KEY = 'thumbnails_generation'
+GENERATION_CHECK_INTERVAL = 5
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def __init__(self):
+        super().__init__()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = float('-inf')
+
+    def prefetch(self, keys):
+        """Загружает в LRU ключи image, которых там ещё нет."""
+        keys = [
+            key for key in keys
+            if key.startswith(IMAGE_PREFIX) and self._recall(key) is None
+        ]
+        if keys:
+            self._load(keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.clear_local()
+
+    def clear_local(self):
+        """Сбрасывает только LRU процесса."""
+        with self._lock:
+            self._local.clear()
+
+    def _check_generation(self, now):
+        """Очищает LRU, если другой процесс удалял кадры."""
+        if now < self._checked_at + GENERATION_CHECK_INTERVAL:
+            return
+        generation = self.cache.get(GENERATION_KEY)
+        with self._lock:
+            self._checked_at = now
+            if generation != self._generation:
+                self._generation = generation
+                self._local.clear()
+
+    def _recall(self, key):
+        now = time.monotonic()
+        self._check_generation(now)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            self._local.move_to_end(key)
+            return entry[0]
+
+    def _remember(self, values):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                if value is EMPTY_VALUE:
+                    expires = now + LOCAL_MISSING_TIMEOUT
+                else:
+                    expires = now + LOCAL_TIMEOUT
+                self._local[key] = (value, expires)
+                self._local.move_to_end(key)
+            while len(self._local) > LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _load(self, keys):
+        """Значения ключей из кеша, промахи - одним запросом к базе."""
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            rows = dict(
+                KVStoreModel.objects.filter(
+                    key__in=missing
+                ).values_list('key', 'value')
+            )
+            found = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+            # Отсутствие тоже кешируется, чтобы не спрашивать базу снова
+            self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        self._remember(values)
+        return values
+
+    def _get_raw(self, key):
+        if not key.startswith(IMAGE_PREFIX):
+            return super()._get_raw(key)
+        value = self._recall(key)
+        if value is None:
+            value = self._load([key])[key]
+        return None if value is EMPTY_VALUE else value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        if key.startswith(IMAGE_PREFIX):
+            self._remember({key: value})
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._forget(keys)
+        if any(key.startswith(IMAGE_PREFIX) for key in keys):
+            self.cache.set(GENERATION_KEY, time.time_ns(), None)
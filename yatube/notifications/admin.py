@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import Notification
+
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'post', 'created', 'is_read', 'emailed')
+    list_filter = ('is_read', 'emailed')
+    raw_id_fields = ('user', 'post')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Notification, NotificationAdmin)
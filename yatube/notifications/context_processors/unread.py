@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from ..unread import unread_count
+
+
+def unread(request):
+    """Добавляет число непрочитанных уведомлений для значка в шапке.
+
+    Счётчик ленивый и берётся из кеша: запрос к базе выполняется, только
+    если шаблон его выводит, а числа в кеше нет.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'unread_notifications': SimpleLazyObject(
+            lambda: unread_count(user.pk)
+        )
+    }
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Notification(models.Model):
+    """Уведомление подписчика о новом посте автора."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Получатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Пост'
+    )
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    is_read = models.BooleanField('Прочитано', default=False)
+    emailed = models.BooleanField('Отправлено в дайджесте', default=False)
+
+    class Meta:
+        ordering = ['-created', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_notification'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'is_read'],
+                name='notification_unread_idx'
+            ),
+        ]
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from core.jobs import enqueue_unique, task
+from posts.models import Follow, Post
+
+from .models import Notification
+from .unread import forget_unread
+
+# Сколько уведомлений создаётся одним INSERT
+FAN_OUT_BATCH = 1000
+# Через сколько секунд после поста отправлять дайджест: посты,
+# вышедшие за это время, попадут в одно письмо
+DIGEST_DELAY = 60 * 30
+# Сколько уведомлений одного пользователя показывать в письме
+DIGEST_MAX_POSTS = 20
+
+
+@task(priority=5)
+def fan_out_post(post_id):
+    """Создаёт уведомления всем подписчикам автора поста пачками.
+
+    Повторный запуск безопасен: дубликаты отсекает уникальное
+    ограничение (user, post).
+    """
+    post = Post.objects.filter(pk=post_id).only('author_id').first()
+    if post is None:
+        return 0
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    total = 0
+    for user_id in followers.iterator(FAN_OUT_BATCH):
+        batch.append(user_id)
+        if len(batch) == FAN_OUT_BATCH:
+            total += create_batch(post_id, batch)
+            batch = []
+    total += create_batch(post_id, batch)
+    if settings.NOTIFICATION_EMAIL_DIGESTS:
+        schedule_digests()
+    return total
+
+
+def create_batch(post_id, user_ids):
+    """Создаёт уведомления пачки; возвращает число новых.
+
+    bulk_create с ignore_conflicts не сообщает, сколько строк вставлено,
+    поэтому уже созданные уведомления отсеиваются заранее. Конфликты с
+    одновременным запуском по-прежнему молча пропускаются.
+    """
+    existing = set(
+        Notification.objects.filter(
+            post_id=post_id, user_id__in=user_ids
+        ).values_list('user_id', flat=True)
+    )
+    batch = [
+        Notification(user_id=user_id, post_id=post_id)
+        for user_id in user_ids if user_id not in existing
+    ]
+    Notification.objects.bulk_create(batch, ignore_conflicts=True)
+    forget_unread(notification.user_id for notification in batch)
+    return len(batch)
+
+
+def schedule_digests():
+    """Ставит отправку дайджестов, если она ещё не запланирована."""
+    enqueue_unique(send_digests, delay=DIGEST_DELAY)
+
+
+@task(priority=-5)
+def send_digests():
+    """Отправляет по одному письму на пользователя со всеми новыми постами.
+
+    В письмо попадают непрочитанные уведомления, которые ещё не
+    отправлялись; после отправки помечаются только вошедшие в письмо.
+    Остальные, сверх DIGEST_MAX_POSTS или пришедшие во время отправки,
+    уйдут следующим дайджестом.
+    """
+    pending = Notification.objects.filter(
+        is_read=False, emailed=False
+    ).exclude(user__email='')
+    # order_by() сбрасывает Meta.ordering: иначе поля сортировки попадут
+    # в SELECT DISTINCT и строк будет по одной на уведомление
+    user_ids = pending.values_list(
+        'user_id', flat=True
+    ).order_by().distinct()
+    for user_id in user_ids.iterator():
+        notifications = list(
+            pending.filter(user_id=user_id).select_related(
+                'user', 'post', 'post__author'
+            )[:DIGEST_MAX_POSTS]
+        )
+        if not notifications:
+            continue
+        user = notifications[0].user
+        context = {
+            'user': user,
+            'notifications': notifications,
+            'total': pending.filter(user_id=user_id).count(),
+        }
+        send_mail(
+            'Новые посты авторов, на которых вы подписаны',
+            render_to_string('notifications/digest_email.txt', context),
+            None,
+            [user.email],
+        )
+        Notification.objects.filter(
+            pk__in=[notification.pk for notification in notifications]
+        ).update(emailed=True)
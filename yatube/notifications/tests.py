@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import jobs
+from core.models import Job
+from posts.models import Follow, Post
+
+from . import tasks
+from .models import Notification
+
+User = get_user_model()
+
+
+class NotificationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.followers = User.objects.bulk_create(
+            User(username=f'follower{i}', email=f'follower{i}@example.com')
+            for i in range(5)
+        )
+        cls.followers = list(
+            User.objects.filter(username__startswith='follower')
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=cls.author) for user in cls.followers
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Страницы ленты, закешированные здесь, не должны попасть в
+        # тесты других приложений
+        self.addCleanup(cache.clear)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_post_create_fans_out_to_followers(self):
+        """Новый пост создаёт уведомления подписчикам через очередь"""
+        self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertEqual(Notification.objects.count(), 0)
+        while jobs.work('test'):
+            pass
+        self.assertEqual(
+            Notification.objects.filter(
+                user__in=self.followers, is_read=False
+            ).count(),
+            len(self.followers)
+        )
+
+    def test_fan_out_is_idempotent(self):
+        """Повторная рассылка не создаёт дубликаты"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(tasks.fan_out_post(post.pk), len(self.followers))
+        self.assertEqual(tasks.fan_out_post(post.pk), 0)
+        self.assertEqual(Notification.objects.count(), len(self.followers))
+        self.assertEqual(
+            Job.objects.filter(name=tasks.send_digests.job_name).count(), 1
+        )
+
+    def test_digest_coalesces_posts(self):
+        """Несколько постов приходят одним письмом"""
+        for text in ('Первый', 'Второй'):
+            post = Post.objects.create(author=self.author, text=text)
+            tasks.fan_out_post(post.pk)
+        tasks.send_digests()
+        self.assertEqual(len(mail.outbox), len(self.followers))
+        self.assertIn('Первый', mail.outbox[0].body)
+        self.assertIn('Второй', mail.outbox[0].body)
+        tasks.send_digests()
+        self.assertEqual(len(mail.outbox), len(self.followers))
+
+    def test_digest_marks_only_sent(self):
+        """Уведомления сверх письма остаются для следующего дайджеста"""
+        for text in ('Первый', 'Второй'):
+            post = Post.objects.create(author=self.author, text=text)
+            tasks.fan_out_post(post.pk)
+        with mock.patch.object(tasks, 'DIGEST_MAX_POSTS', 1):
+            tasks.send_digests()
+        self.assertEqual(
+            Notification.objects.filter(emailed=False).count(),
+            len(self.followers)
+        )
+        tasks.send_digests()
+        self.assertEqual(len(mail.outbox), 2 * len(self.followers))
+        self.assertFalse(Notification.objects.filter(emailed=False))
+
+    def test_unread_count_cached(self):
+        """Счётчик в шапке читается из кеша и сбрасывается при изменениях"""
+        follower = self.followers[0]
+        client = Client()
+        client.force_login(follower)
+        url = reverse('posts:index')
+        client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        self.assertFalse(any(
+            'notifications_notification' in query['sql']
+            for query in context.captured_queries
+        ))
+        post = Post.objects.create(author=self.author, text='Пост')
+        tasks.fan_out_post(post.pk)
+        self.assertEqual(client.get(url).context['unread_notifications'], 1)
+        client.get(reverse('notifications:notification_list'))
+        self.assertEqual(client.get(url).context['unread_notifications'], 0)
+
+    def test_digest_reads_each_user_once(self):
+        """Пользователи для дайджеста выбираются без повторов"""
+        for text in ('Первый', 'Второй', 'Третий'):
+            post = Post.objects.create(author=self.author, text=text)
+            tasks.fan_out_post(post.pk)
+        # Выборка пользователей, затем на каждого: уведомления, число,
+        # отметка отправки
+        with self.assertNumQueries(1 + 3 * len(self.followers)):
+            tasks.send_digests()
+
+    def test_notification_list_marks_read(self):
+        """Страница уведомлений отмечает их прочитанными"""
+        follower = self.followers[0]
+        post = Post.objects.create(author=self.author, text='Пост')
+        tasks.fan_out_post(post.pk)
+        client = Client()
+        client.force_login(follower)
+        response = client.get(reverse('posts:index'))
+        self.assertEqual(response.context['unread_notifications'], 1)
+        response = client.get(
+            reverse('notifications:notification_list')
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertFalse(follower.notifications.filter(is_read=False))
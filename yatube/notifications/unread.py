@@ -0,0 +1,30 @@
+"""Кеш числа непрочитанных уведомлений для значка в шапке.
+
+Число сбрасывается там, где уведомления создаются (fan_out_post) и
+читаются (страница уведомлений). Каскадное удаление вместе с постом
+кеш не трогает: такое число живёт не дольше UNREAD_CACHE_TIMEOUT.
+"""
+from django.core.cache import cache
+
+from .models import Notification
+
+UNREAD_CACHE_TIMEOUT = 60 * 5
+
+
+def unread_cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    key = unread_cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            user_id=user_id, is_read=False
+        ).count()
+        cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def forget_unread(user_ids):
+    cache.delete_many([unread_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,27 @@
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.shortcuts import render
+
+from .unread import forget_unread
+
+LIMIT_NOTIFICATIONS = 20
+
+
+@login_required
+def notification_list(request):
+    notifications = request.user.notifications.select_related(
+        'post', 'post__author'
+    )
+    paginator = Paginator(notifications, LIMIT_NOTIFICATIONS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    # Открытая страница отмечает показанные уведомления прочитанными
+    marked = request.user.notifications.filter(
+        pk__in=[notification.pk for notification in page_obj],
+        is_read=False
+    ).update(is_read=True)
+    if marked:
+        forget_unread([request.user.pk])
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'notifications/notification_list.html', context)
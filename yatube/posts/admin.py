@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Group, Post
+from .models import Group, ImageBlob, Post
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,6 +11,12 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'refs')
+    search_fields = ('name',)
+
+
 admin.site.register(Post, PostAdmin)
+admin.site.register(ImageBlob, ImageBlobAdmin)
 
 admin.site.register(Group)
@@ -0,0 +1,256 @@
+"""Подсчёт ссылок постов на файлы картинок.
+
+Один файл в posts.storage может принадлежать многим постам, поэтому
+удалять его вместе с постом нельзя. ImageBlob хранит число постов
+с этим файлом: сохранение поста с новой картинкой увеличивает его,
+замена, очистка картинки и удаление поста - уменьшают. Файл без ссылок
+удаляется вместе с миниатюрами после фиксации транзакции, если он не
+моложе UPLOAD_GRACE секунд: такой файл мог только что записать или
+обновить параллельный запрос, который ещё не вызвал acquire(). Его
+позже уберёт сборщик мусора (posts.media_gc).
+
+Картинки, загруженные до хранилища по содержимому или лежащие не на
+своём месте в раскладке, переносит relocate() (команды dedupe_images
+и shard_media).
+"""
+import logging
+import os
+import posixpath
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .media_gc import is_fresh
+from .models import ImageBlob, Post
+from .storage import content_name, image_storage
+
+CONTENT_NAME = re.compile(r'([0-9a-f]{64})(\.\w+)')
+READ_CHUNK = 500
+UPLOAD_GRACE = 60 * 10
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    # Сначала увеличение: запись с refs=0, которую release() ещё не
+    # удалил, оживает, и release() её уже не удалит
+    while True:
+        with transaction.atomic():
+            if ImageBlob.objects.filter(name=name).update(
+                refs=F('refs') + 1
+            ):
+                return
+            try:
+                with transaction.atomic():
+                    ImageBlob.objects.create(name=name, refs=1)
+                return
+            except IntegrityError:
+                # Запись создал соседний запрос - увеличиваем её
+                continue
+
+
+def release(name):
+    with transaction.atomic():
+        ImageBlob.objects.filter(name=name).update(refs=F('refs') - 1)
+        deleted, _ = ImageBlob.objects.filter(
+            name=name, refs__lte=0
+        ).delete()
+    if deleted:
+        transaction.on_commit(lambda: delete_file(name))
+
+
+def delete_file(name):
+    # Ту же картинку могли загрузить снова: повторная загрузка пишет
+    # файл или обновляет его время раньше, чем создаёт ссылку
+    if is_fresh(name, time.time() - UPLOAD_GRACE) \
+            or ImageBlob.objects.filter(name=name).exists():
+        return
+    remove_file(name)
+
+
+def remove_file(name):
+    try:
+        delete_thumbnails(ImageFile(name, image_storage))
+    except (OSError, SuspiciousFileOperation):
+        # Транзакция уже зафиксирована, ошибка файла её не отменит
+        logger.exception('Не удалось удалить картинку %s', name)
+
+
+def image_name(instance):
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    # Без обращения к полю: дескриптор ImageField не создаёт FieldFile,
+    # а для .only() без картинки поле не загружается
+    instance._saved_image = image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, **kwargs):
+    if 'image' in instance.get_deferred_fields():
+        return
+    old = '' if created else instance._saved_image
+    new = image_name(instance)
+    if old == new:
+        return
+    if new:
+        acquire(new)
+    if old:
+        release(old)
+    instance._saved_image = new
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        name = image_name(instance)
+        if name:
+            release(name)
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME.fullmatch(posixpath.basename(name)))
+
+
+def layout_name(name):
+    """Имя файла name в раскладке хранилища.
+
+    None - имя не по содержимому, файл нужно прочитать и хешировать.
+    """
+    directory, basename = posixpath.split(name)
+    match = CONTENT_NAME.fullmatch(basename)
+    if match is None:
+        return None
+    digest, ext = match.groups()
+    if directory.endswith(posixpath.join(digest[:2], digest[2:4])):
+        return name
+    return content_name(directory, digest, ext)
+
+
+def place(name):
+    """Кладёт файл name на его место в раскладке, не удаляя старый.
+
+    Работает только с файлами, поэтому безопасна в потоках. Возвращает
+    новое имя или None, если файла нет в хранилище.
+    """
+    if not image_storage.exists(name):
+        return None
+    target = layout_name(name)
+    if target is None:
+        with image_storage.open(name) as source:
+            return image_storage.save(name, source)
+    if target != name:
+        path = image_storage.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            try:
+                os.link(image_storage.path(name), path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # Файловая система без жёстких ссылок
+                shutil.copyfile(image_storage.path(name), path)
+    return target
+
+
+def move_references(blob, name):
+    """Переводит посты и счётчик ссылок с файла blob на name."""
+    old = blob.name
+    if old == name:
+        return
+    with transaction.atomic():
+        refs = Post.objects.filter(image=old).update(image=name)
+        target, created = ImageBlob.objects.get_or_create(
+            name=name, defaults={'refs': refs}
+        )
+        if not created:
+            ImageBlob.objects.filter(pk=target.pk).update(
+                refs=F('refs') + refs
+            )
+        blob.delete()
+        # Старое имя загрузки не получат: они пишутся только в раскладку
+        transaction.on_commit(lambda: remove_file(old))
+
+
+def adopt(blob):
+    """Переименовывает файл blob по содержимому и переводит на него посты.
+
+    Возвращает новое имя или None, если файла нет в хранилище.
+    """
+    name = place(blob.name)
+    if name is not None:
+        move_references(blob, name)
+    return name
+
+
+def relocate(blobs, workers=1):
+    """Переносит файлы blobs в раскладку хранилища.
+
+    Файлы копируются и хешируются в workers потоках, а ссылки в базе
+    переводятся из текущего потока после каждой пачки: запись в базу
+    из многих потоков SQLite всё равно выполнил бы по очереди.
+    Возвращает число перенесённых и ненайденных файлов.
+    """
+    moved = missing = 0
+    blobs = iter(blobs)
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            batch = list(islice(blobs, READ_CHUNK))
+            if not batch:
+                return moved, missing
+            names = executor.map(place, [blob.name for blob in batch])
+            for blob, name in zip(batch, names):
+                if name is None:
+                    missing += 1
+                else:
+                    move_references(blob, name)
+                    moved += 1
+
+
+def iter_blobs(predicate):
+    """Счётчики, имя которых подходит под predicate, пачками по id."""
+    last = 0
+    while True:
+        blobs = list(
+            ImageBlob.objects.filter(pk__gt=last).order_by('pk')[:READ_CHUNK]
+        )
+        if not blobs:
+            return
+        last = blobs[-1].pk
+        for blob in blobs:
+            if predicate(blob.name):
+                yield blob
+
+
+def legacy_blobs():
+    """Файлы, загруженные до хранилища по содержимому."""
+    return iter_blobs(lambda name: not is_content_name(name))
+
+
+def misplaced_blobs():
+    """Файлы не на своём месте в раскладке хранилища."""
+    return iter_blobs(lambda name: layout_name(name) != name)
+
+
+def disk_usage(root=None):
+    """Число файлов и байт под root (по умолчанию MEDIA_ROOT)."""
+    files = size = 0
+    for directory, _, names in os.walk(root or settings.MEDIA_ROOT):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(directory, name))
+    return files, size
@@ -0,0 +1,121 @@
+"""Буферизованные счётчики просмотров постов.
+
+UPDATE на каждый просмотр упирается в запись SQLite, поэтому просмотры
+копятся в памяти процесса и сбрасываются в базу пачкой: когда в буфере
+набралось FLUSH_SIZE просмотров или через FLUSH_INTERVAL секунд после
+первого несброшенного. Срок отсчитывает таймер, который заводит первый
+просмотр в пустом буфере, так что и в простаивающем процессе буфер не
+ждёт следующего запроса; при штатной остановке процесса буфер
+сбрасывается atexit. При падении процесса теряются только просмотры
+из буфера: не больше FLUSH_SIZE и только за последние FLUSH_INTERVAL
+секунд.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 10
+FLUSH_SIZE = 1000
+# Сколько id постов передавать в одном UPDATE
+UPDATE_BATCH = 500
+
+
+class ViewBuffer:
+    """Копит просмотры постов процесса до сброса в базу."""
+
+    def __init__(self, interval=FLUSH_INTERVAL, size=FLUSH_SIZE):
+        self.interval = interval
+        self.size = size
+        self.counts = Counter()
+        self.total = 0
+        self.flushed_at = time.monotonic()
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def hit(self, post_id):
+        with self.lock:
+            self.counts[post_id] += 1
+            self.total += 1
+            due = (
+                self.total >= self.size
+                or time.monotonic() - self.flushed_at >= self.interval
+            )
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+
+    def pending(self, post_id):
+        """Просмотры поста, ещё не записанные в базу."""
+        with self.lock:
+            return self.counts.get(post_id, 0)
+
+    def reset(self):
+        """Отбрасывает несброшенные просмотры, например между тестами."""
+        with self.lock:
+            self.counts = Counter()
+            self.total = 0
+            self._cancel_timer()
+
+    def _schedule(self):
+        # Вызывается под self.lock
+        if self.timer is None:
+            self.timer = threading.Timer(
+                self.interval, self.flush_in_background
+            )
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # У потока таймера своё соединение, держать его незачем
+            connection.close()
+
+    def flush(self):
+        """Записывает буфер в базу, возвращает число просмотров."""
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            total, self.total = self.total, 0
+            self.flushed_at = time.monotonic()
+            self._cancel_timer()
+        if not counts:
+            return 0
+        # Один UPDATE на каждое различное приращение, а не на пост
+        by_increment = defaultdict(list)
+        for post_id, count in counts.items():
+            by_increment[count].append(post_id)
+        try:
+            with transaction.atomic():
+                for count, post_ids in by_increment.items():
+                    for start in range(0, len(post_ids), UPDATE_BATCH):
+                        Post.objects.filter(
+                            pk__in=post_ids[start:start + UPDATE_BATCH]
+                        ).update(views=F('views') + count)
+        except Exception:
+            logger.exception('Не удалось сохранить просмотры постов')
+            with self.lock:
+                self.counts.update(counts)
+                self.total += total
+                self._schedule()
+            return 0
+        return total
+
+
+views = ViewBuffer()
+atexit.register(views.flush)
@@ -0,0 +1,54 @@
+"""Курсорная (keyset) пагинация по убыванию (поле даты, id).
+
+Курсор - непрозрачная строка с датой и id последнего показанного
+объекта. Следующая страница выбирается условием "строго раньше
+курсора", поэтому стоимость не зависит от глубины, в отличие от OFFSET.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode(moment, pk):
+    raw = f'{moment.isoformat()}|{pk}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode(cursor):
+    """Разбирает курсор в (дата, id), ValueError - если он испорчен."""
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        moment, pk = raw.split('|')
+        moment = parse_datetime(moment)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Некорректный курсор')
+    if moment is None:
+        raise ValueError('Некорректный курсор')
+    return moment, pk
+
+
+def seek(queryset, cursor, field):
+    """Сортирует queryset по убыванию (field, id) и пропускает всё
+    до курсора включительно."""
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        moment, pk = decode(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': moment}) | Q(**{field: moment, 'id__lt': pk})
+        )
+    return queryset
+
+
+def paginate(objects, limit, field):
+    """Режет limit + 1 выбранных объектов на страницу и курсор дальше.
+
+    Лишний объект нужен только чтобы узнать, есть ли следующая страница.
+    """
+    objects = list(objects)
+    page = objects[:limit]
+    if len(objects) <= limit:
+        return page, None
+    last = page[-1]
+    return page, encode(getattr(last, field), last.pk)
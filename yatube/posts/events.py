@@ -0,0 +1,139 @@
+"""Server-Sent Events о новых постах.
+
+Один Broadcaster на процесс опрашивает базу раз в POLL_INTERVAL секунд:
+читает посты с id больше последнего увиденного и будит все открытые
+потоки. Сколько бы клиентов ни было подключено, запрос к базе один;
+каждый поток сам считает, сколько новых постов подходит под его ленту.
+
+Каждый открытый поток держит поток сервера до STREAM_LIFETIME секунд.
+С синхронными воркерами (gunicorn sync, runserver без потоков) десяток
+открытых вкладок займёт весь сервер, поэтому события включаются
+настройкой POST_EVENTS и только там, где потоки обслуживают асинхронные
+или gevent-воркеры (gunicorn -k gevent).
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.db import close_old_connections
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Как часто процесс проверяет новые посты
+POLL_INTERVAL = 2
+# Сколько последних постов помнить для отстающих клиентов
+HISTORY_SIZE = 1000
+# Пустой комментарий, чтобы прокси не закрывали соединение
+HEARTBEAT_INTERVAL = 15
+# Сколько живёт один поток; браузер переподключится сам
+# с заголовком Last-Event-ID
+STREAM_LIFETIME = 60 * 5
+
+
+class Broadcaster:
+    """Общий для процесса источник событий о новых постах."""
+
+    def __init__(self):
+        self.high_water = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name='posts-broadcaster', daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Не удалось проверить новые посты')
+            time.sleep(POLL_INTERVAL)
+
+    def poll(self):
+        """Читает новые посты одним запросом и будит подписчиков."""
+        if self.high_water is None:
+            latest = Post.objects.order_by('-id').values_list(
+                'id', flat=True
+            ).first()
+            with self.condition:
+                self.high_water = latest or 0
+                self.condition.notify_all()
+            return
+        new_posts = list(
+            Post.objects.filter(id__gt=self.high_water)
+            .order_by('id')
+            .values_list('id', 'author_id', 'group_id')
+        )
+        if not new_posts:
+            return
+        with self.condition:
+            self.history.extend(new_posts)
+            self.high_water = new_posts[-1][0]
+            self.condition.notify_all()
+
+    def wait(self, since, timeout):
+        """Ждёт постов новее since, возвращает текущую отметку."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.high_water is not None
+                and self.high_water > since,
+                timeout
+            )
+            return self.high_water
+
+    def posts_since(self, since):
+        with self.condition:
+            return [post for post in self.history if post[0] > since]
+
+
+broadcaster = Broadcaster()
+
+
+def event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def event_stream(since, matches, source=broadcaster):
+    """Генератор SSE: событие "posts" с числом новых постов ленты.
+
+    since - id последнего поста, который клиент уже видел (None - с
+    момента подключения), matches(author_id, group_id) - фильтр ленты.
+    """
+    source.start()
+    if since is None:
+        since = source.wait(-1, HEARTBEAT_INTERVAL) or 0
+    # id события - отметка, от которой ведётся счёт: после
+    # переподключения браузер пришлёт её в Last-Event-ID
+    yield 'retry: 5000\n' + event('ready', {}, event_id=since)
+    seen = since
+    sent = 0
+    deadline = time.monotonic() + STREAM_LIFETIME
+    while time.monotonic() < deadline:
+        high_water = source.wait(seen, HEARTBEAT_INTERVAL)
+        if high_water is None or high_water <= seen:
+            yield ': heartbeat\n\n'
+            continue
+        seen = high_water
+        new = sum(
+            1 for _, author_id, group_id in source.posts_since(since)
+            if matches(author_id, group_id)
+        )
+        if new != sent:
+            sent = new
+            yield event('posts', {'new': new}, event_id=since)
@@ -0,0 +1,146 @@
+"""RSS и Atom ленты главной, групп и авторов.
+
+Читатели лент опрашивают их постоянно, а новые посты появляются
+редко. Поэтому готовый XML хранится в кеше под ключом с версией
+набора постов ленты (см. versions), а версия отдаётся как ETag:
+опрос без новых постов получает 304 после одного обращения к кешу,
+без запросов к базе.
+"""
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import lookups
+from .models import Post
+from .rows import TEXT_ROW_FIELDS, PostRows
+from .versions import get_version
+
+LIMIT_FEED = 20
+FEED_TIMEOUT = 60 * 15
+
+
+class PostsFeed(Feed):
+    """Общая часть лент: посты из PostRows без моделей."""
+
+    def item_title(self, item):
+        return Truncator(item.text).chars(50)
+
+    def item_description(self, item):
+        return item.preview_html
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=(item.pk,))
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+
+class IndexFeed(PostsFeed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return PostRows(Post.objects.all(), TEXT_ROW_FIELDS)[:LIMIT_FEED]
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return lookups.groups.get_or_404(slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def items(self, group):
+        return PostRows(group.posts.all(), TEXT_ROW_FIELDS)[:LIMIT_FEED]
+
+
+class AuthorFeed(PostsFeed):
+    def get_object(self, request, username):
+        return lookups.authors.get_or_404(username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Записи пользователя {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def items(self, author):
+        return PostRows(author.posts.all(), TEXT_ROW_FIELDS)[:LIMIT_FEED]
+
+
+class IndexAtomFeed(IndexFeed):
+    feed_type = Atom1Feed
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+
+def cached_feed(feed, get_scope):
+    """Оборачивает ленту кешем XML и ответами 304 по ETag.
+
+    get_scope(**kwargs) возвращает имя ленты для версии, например
+    'group:3'; ленты групп и авторов ищут объект через lookups,
+    поэтому повторный опрос не обращается к базе.
+    """
+    name = type(feed).__name__
+
+    def view(request, **kwargs):
+        scope = get_scope(**kwargs)
+        etag = f'"{name}-{scope}-{get_version(scope)}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        key = f'feed:{etag}'
+        cached = cache.get(key)
+        if cached is None:
+            response = feed(request, **kwargs)
+            cached = (response.content, response['Content-Type'])
+            cache.set(key, cached, FEED_TIMEOUT)
+        response = HttpResponse(cached[0], content_type=cached[1])
+        response['ETag'] = etag
+        return response
+    return view
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{lookups.groups.get_or_404(slug).pk}'
+
+
+def author_scope(username):
+    return f'author:{lookups.authors.get_or_404(username).pk}'
+
+
+index_rss = cached_feed(IndexFeed(), index_scope)
+index_atom = cached_feed(IndexAtomFeed(), index_scope)
+group_rss = cached_feed(GroupFeed(), group_scope)
+group_atom = cached_feed(GroupAtomFeed(), group_scope)
+author_rss = cached_feed(AuthorFeed(), author_scope)
+author_atom = cached_feed(AuthorAtomFeed(), author_scope)
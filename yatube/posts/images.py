@@ -0,0 +1,142 @@
+"""Варианты картинки поста для srcset и заглушка до её загрузки.
+
+Лента показывает картинку кадром 960x339, но телефону хватает
+ширины 320-720. Поэтому для каждой картинки строятся кадры
+нескольких ширин (и WebP, если Pillow собран с ним), а браузер сам
+выбирает подходящий по srcset. Пока картинка грузится, на её месте
+растянута крошечная заглушка из data URI, сохранённая в Post.
+
+Кадры строит задача warm_thumbnails (variants()), страницы только
+читают готовые (stored_variants()): пока кадров нет, выводится сама
+картинка. Ленты перед выводом вызывают prefetch(): описания всех кадров
+страницы читаются из хранилища ключей sorl одним запросом.
+"""
+import base64
+import functools
+import io
+
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .storage import image_storage
+
+# Основной кадр, как в {% thumbnail %} до вариантов
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_SIZE = (960, 339)
+VARIANT_WIDTHS = (320, 480, 720, 960)
+# Первый подходящий формат браузер выберет из <source>, JPEG - запасной
+FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+PLACEHOLDER_SIZE = (16, 6)
+PLACEHOLDER_QUALITY = 40
+
+
+def variant_geometry(width):
+    height = round(width * THUMBNAIL_SIZE[1] / THUMBNAIL_SIZE[0])
+    return f'{width}x{height}'
+
+
+def variant_options(image_format):
+    """Параметры кадра, как их дополняет get_thumbnail()."""
+    options = {'format': image_format, **THUMBNAIL_OPTIONS}
+    for key, value in default.backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in default.backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+@functools.lru_cache(maxsize=4096)
+def thumbnail_names(image):
+    """Кадры картинки по имени: ((формат, ширина, имя кадра), ...)."""
+    source = ImageFile(image, image_storage)
+    names = []
+    for image_format in FORMATS:
+        options = variant_options(image_format)
+        for width in VARIANT_WIDTHS:
+            # Имя кадра sorl строит из источника, геометрии и параметров
+            name = default.backend._get_thumbnail_filename(
+                source, variant_geometry(width), options
+            )
+            names.append((image_format, width, name))
+    # Имена зависят только от имени картинки, их можно помнить
+    return tuple(names)
+
+
+def thumbnail_keys(image):
+    """Ключи хранилища sorl, которые прочитает stored_variants(image)."""
+    return [
+        add_prefix(ImageFile(name, default.storage).key)
+        for _, _, name in thumbnail_names(image)
+    ]
+
+
+def prefetch(posts):
+    """Загружает описания кадров всех картинок постов одним запросом."""
+    load = getattr(default.kvstore, 'prefetch', None)
+    if load is None:
+        # Хранилище sorl без пакетного чтения
+        return
+    load([
+        key
+        for post in posts if post.image
+        for key in thumbnail_keys(getattr(post.image, 'name', post.image))
+    ])
+
+
+def variants(image):
+    """Кадры картинки по форматам: [(MIME-тип, [(url, ширина), ...])].
+
+    Недостающие кадры sorl.thumbnail строит сразу, поэтому вызывается
+    только из задачи warm_thumbnails.
+    """
+    if isinstance(image, str):
+        # Имя из PostRow: ключи миниатюр те же, что у поля модели
+        image = ImageFile(image, image_storage)
+    sources = []
+    for image_format in FORMATS:
+        urls = []
+        for width in VARIANT_WIDTHS:
+            thumbnail = get_thumbnail(
+                image, variant_geometry(width), format=image_format,
+                **THUMBNAIL_OPTIONS
+            )
+            urls.append((thumbnail.url, width))
+        sources.append((MIME_TYPES[image_format], urls))
+    return sources
+
+
+def stored_variants(image):
+    """Как variants(), но только из готовых кадров; None, если хоть
+    одного кадра ещё нет. Ничего не строит.
+    """
+    sources = {}
+    for image_format, width, name in thumbnail_names(
+        getattr(image, 'name', image)
+    ):
+        thumbnail = default.kvstore.get(ImageFile(name, default.storage))
+        if thumbnail is None:
+            return None
+        sources.setdefault(image_format, []).append((thumbnail.url, width))
+    return [
+        (MIME_TYPES[image_format], urls)
+        for image_format, urls in sources.items()
+    ]
+
+
+def placeholder(image):
+    """Заглушка картинки: кадр 16x6 в JPEG как data URI."""
+    with image.open('rb'):
+        picture = Image.open(image)
+        picture = ImageOps.fit(picture.convert('RGB'), PLACEHOLDER_SIZE)
+    buffer = io.BytesIO()
+    picture.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
@@ -0,0 +1,93 @@
+"""Кеш горячих объектов: группы по slug и авторы по username.
+
+Эти строки почти не меняются, а ищутся в начале самых нагруженных
+страниц. Кеш живёт в памяти процесса, ограничен по размеру (LRU)
+и по времени жизни записи, помнит и отсутствующие объекты (404).
+Записи сбрасываются сигналами при сохранении и удалении объектов;
+время жизни ограничивает устаревание в соседних процессах.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404
+
+from .models import Group, User
+
+MISSING = object()
+
+
+class ObjectCache:
+    """Read-through LRU-кеш объектов модели по уникальному полю.
+
+    Возвращаемые объекты общие для всех запросов процесса,
+    поэтому их нельзя изменять.
+    """
+
+    def __init__(self, model, field, maxsize=1024, timeout=60,
+                 missing_timeout=10):
+        self.model = model
+        self.field = field
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.missing_timeout = missing_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        post_save.connect(self._invalidate_instance, sender=model)
+        post_delete.connect(self._invalidate_instance, sender=model)
+
+    def get(self, value):
+        """Возвращает объект или None, если его нет в базе."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(value)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(value)
+                obj = entry[0]
+                return None if obj is MISSING else obj
+        obj = self.model._default_manager.filter(
+            **{self.field: value}
+        ).first()
+        if obj is None:
+            expires = now + self.missing_timeout
+        else:
+            expires = now + self.timeout
+        with self._lock:
+            self._entries[value] = (MISSING if obj is None else obj, expires)
+            self._entries.move_to_end(value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return obj
+
+    def get_or_404(self, value):
+        obj = self.get(value)
+        if obj is None:
+            raise Http404(
+                f'No {self.model._meta.object_name} matches the given query.'
+            )
+        return obj
+
+    def invalidate(self, value):
+        with self._lock:
+            self._entries.pop(value, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _invalidate_instance(self, sender, instance, **kwargs):
+        # При переименовании старое значение поля уже неизвестно,
+        # поэтому удаляем и все записи с тем же pk
+        with self._lock:
+            self._entries.pop(getattr(instance, self.field), None)
+            stale = [
+                value for value, (obj, _) in self._entries.items()
+                if obj is not MISSING and obj.pk == instance.pk
+            ]
+            for value in stale:
+                del self._entries[value]
+
+
+groups = ObjectCache(Group, 'slug')
+authors = ObjectCache(User, 'username')
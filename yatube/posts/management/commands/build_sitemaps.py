@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Дописывает в карту сайта новые посты, профили и группы; '
+        'с --full строит её заново'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Перестроить все файлы, а не только последний'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        written = sitemaps.build(full=options['full'])
+        self.stdout.write(
+            f'Записано адресов: {written} '
+            f'за {time.monotonic() - start:.1f} с'
+        )
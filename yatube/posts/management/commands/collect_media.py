@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import media_gc
+
+LABELS = {'images': 'Картинки', 'thumbnails': 'Миниатюры'}
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки и миниатюры, на которые ничто не ссылается'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=media_gc.GRACE,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удалять'
+        )
+
+    def handle(self, *args, **options):
+        found = media_gc.collect(
+            grace=options['grace'], dry_run=options['dry_run']
+        )
+        verb = 'найдено' if options['dry_run'] else 'удалено'
+        for section, (files, size) in found.items():
+            self.stdout.write(
+                f'{LABELS[section]}: {verb} {files} файлов, '
+                f'{size / 1024 / 1024:.1f} МБ'
+            )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.related import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Индексирует все посты и пересчитывает похожие посты по TF-IDF'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        posts = rebuild()
+        self.stdout.write(
+            f'Похожие посты для {posts} постов '
+            f'посчитаны за {time.monotonic() - start:.1f} с'
+        )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import compute_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации "на кого подписаться" по графу'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        users = compute_suggestions()
+        self.stdout.write(
+            f'Рекомендации для {users} пользователей '
+            f'посчитаны за {time.monotonic() - start:.1f} с'
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+def megabytes(size):
+    return f'{size / 1024 / 1024:.1f} МБ'
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому '
+        'и показывает место на диске до и после'
+    )
+
+    def handle(self, *args, **options):
+        files, size = blobs.disk_usage()
+        self.stdout.write(f'До: {files} файлов, {megabytes(size)}')
+        adopted, missing = blobs.relocate(blobs.legacy_blobs())
+        files_after, size_after = blobs.disk_usage()
+        self.stdout.write(
+            f'После: {files_after} файлов, {megabytes(size_after)}; '
+            f'освобождено {megabytes(size - size_after)}'
+        )
+        self.stdout.write(
+            f'Перенесено картинок: {adopted}, нет в хранилище: {missing}'
+        )
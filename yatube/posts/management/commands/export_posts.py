@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.rows import TEXT_ROW_FIELDS, PostRows
+
+
+class Command(BaseCommand):
+    help = 'Выгружает ленту постов в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--author', help='username автора')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        # Строки читаются потоком, память не растёт с размером таблицы
+        for row in PostRows(posts, TEXT_ROW_FIELDS):
+            self.stdout.write(json.dumps(row.as_dict(), ensure_ascii=False))
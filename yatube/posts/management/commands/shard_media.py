@@ -0,0 +1,29 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает картинки постов по вложенным каталогам хранилища '
+        'и заодно переименовывает старые файлы по содержимому'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Сколько файлов переносить параллельно'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        moved, missing = blobs.relocate(
+            blobs.misplaced_blobs(), workers=options['workers']
+        )
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, нет в хранилище: {missing} '
+            f'за {time.monotonic() - start:.1f} с'
+        )
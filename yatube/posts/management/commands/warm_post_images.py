@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.jobs import enqueue
+from posts.models import Post
+from posts.tasks import warm_thumbnails
+
+# Догоняющие задачи уступают очередь кадрам новых постов
+BACKFILL_PRIORITY = 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь построение кадров и заглушек для постов '
+        'с картинкой, у которых их ещё нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='перестроить кадры всех постов с картинкой'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(placeholder='')
+        post_ids = posts.order_by('-pub_date').values_list('pk', flat=True)
+        count = 0
+        # Одна транзакция на все задачи вместо фиксации каждой строки
+        with transaction.atomic():
+            for post_id in post_ids.iterator():
+                enqueue(warm_thumbnails, post_id, priority=BACKFILL_PRIORITY)
+                count += 1
+        self.stdout.write(f'Поставлено задач warm_thumbnails: {count}')
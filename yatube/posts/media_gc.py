@@ -0,0 +1,134 @@
+"""Сборка мусора среди картинок постов и миниатюр.
+
+Файлы обходятся потоково, os.scandir по одному каталогу, и сверяются
+с базой пачками по READ_CHUNK имён, так что память не зависит от числа
+файлов. Картинка жива, пока на неё ссылается ImageBlob или пост,
+миниатюра - пока о ней знает хранилище ключей sorl.thumbnail. Файлы
+моложе grace секунд не трогаются: это могут быть загрузки, транзакция
+которых ещё не зафиксирована. Повторная загрузка той же картинки
+обновляет время изменения файла, а перед удалением ссылки и время
+проверяются ещё раз.
+"""
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import ImageBlob, Post
+from .storage import image_storage
+
+GRACE = 60 * 60 * 24
+READ_CHUNK = 1000
+
+
+def scan(path):
+    """Файлы под path в глубину, без списка всего дерева в памяти."""
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan(entry.path)
+            else:
+                yield entry
+
+
+def old_files(directory, deadline):
+    """(имя в хранилище, размер) файлов, изменённых до deadline."""
+    root = settings.MEDIA_ROOT
+    for entry in scan(os.path.join(root, directory)):
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime <= deadline:
+            name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            yield name, stat.st_size
+
+
+def unreferenced_images(names):
+    blobs = ImageBlob.objects.filter(name__in=names)
+    posts = Post.objects.filter(image__in=names)
+    alive = {
+        *blobs.values_list('name', flat=True),
+        *posts.values_list('image', flat=True),
+    }
+    return [name for name in names if name not in alive]
+
+
+def unreferenced_thumbnails(names):
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    known = set(
+        KVStore.objects.filter(key__in=keys).values_list('key', flat=True)
+    )
+    return [name for key, name in keys.items() if key not in known]
+
+
+def is_fresh(name, deadline):
+    try:
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        return os.stat(path).st_mtime > deadline
+    except FileNotFoundError:
+        return True
+
+
+def remove_image(name, deadline):
+    # Пачка проверялась раньше: картинку могли загрузить снова
+    if is_fresh(name, deadline) \
+            or ImageBlob.objects.filter(name=name).exists() \
+            or Post.objects.filter(image=name).exists():
+        return False
+    # Вместе с файлом удаляются его миниатюры и их ключи
+    delete_thumbnails(ImageFile(name, image_storage))
+    return True
+
+
+def remove_thumbnail(name, deadline):
+    if is_fresh(name, deadline):
+        return False
+    default.storage.delete(name)
+    return True
+
+
+SECTIONS = {
+    'images': (
+        Post._meta.get_field('image').upload_to,
+        unreferenced_images,
+        remove_image,
+    ),
+    'thumbnails': (
+        thumbnail_settings.THUMBNAIL_PREFIX,
+        unreferenced_thumbnails,
+        remove_thumbnail,
+    ),
+}
+
+
+def collect(grace=GRACE, dry_run=False):
+    """Удаляет файлы без ссылок; возвращает число и объём по разделам."""
+    found = {}
+    # Картинки раньше миниатюр: удаление картинки убирает и её миниатюры
+    for section, (directory, unreferenced, remove) in SECTIONS.items():
+        files = size = 0
+        deadline = time.time() - grace
+        stream = old_files(directory, deadline)
+        while True:
+            batch = dict(islice(stream, READ_CHUNK))
+            if not batch:
+                break
+            for name in unreferenced(list(batch)):
+                if not dry_run and not remove(name, deadline):
+                    continue
+                files += 1
+                size += batch[name]
+        found[section] = (files, size)
+    return found
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-19 12:16
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+PREVIEW_LENGTH = 300
+
+
+def render_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'text').iterator(BATCH_SIZE):
+        post.text_html = linebreaks(post.text, autoescape=True)
+        post.preview_html = linebreaks(
+            Truncator(post.text).chars(PREVIEW_LENGTH), autoescape=True
+        )
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['text_html', 'preview_html'])
+            batch = []
+    Post.objects.bulk_update(batch, ['text_html', 'preview_html'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='preview_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью поста в HTML'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Текст поста в HTML'),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
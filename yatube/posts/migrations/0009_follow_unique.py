@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-19 12:22
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+BATCH_SIZE = 500
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = (
+        Follow.objects.values('user', 'author')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+        .values_list('user', 'author', 'keep_id')
+    )
+    # Удалённые пары пропадают из выборки, поэтому каждый раз
+    # берём следующую пачку сначала
+    while True:
+        batch = list(duplicates[:BATCH_SIZE])
+        if not batch:
+            break
+        # Оставляем самую раннюю подписку из каждой пары user-author
+        for user_id, author_id, keep_id in batch:
+            Follow.objects.filter(
+                user_id=user_id, author_id=author_id
+            ).exclude(id=keep_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_text_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-19 16:05
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+BATCH_SIZE = 500
+
+
+def count_image_refs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    refs = (
+        Post.objects.exclude(image='')
+        .values('image')
+        .annotate(refs=Count('id'))
+        .order_by()
+        .values_list('image', 'refs')
+    )
+    ImageBlob.objects.bulk_create(
+        (ImageBlob(name=name, refs=count) for name, count in refs.iterator()),
+        batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылки')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(count_image_refs, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,15 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from .storage import image_storage
 
 User = get_user_model()
 
+# Длина превью поста в символах для страниц со списками
+PREVIEW_LENGTH = 300
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -40,14 +47,69 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True
     )
+    # Крошечная версия картинки в data URI, см. posts.images
+    placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    # HTML-версии текста считаются один раз при сохранении,
+    # чтобы не прогонять linebreaks на каждом рендере
+    text_html = models.TextField(
+        'Текст поста в HTML',
+        blank=True,
+        editable=False
+    )
+    preview_html = models.TextField(
+        'Превью поста в HTML',
+        blank=True,
+        editable=False
+    )
+    # Пишется пачками из posts.counters, а не на каждый просмотр
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.text[:15]
 
+    def render_text(self):
+        """Заполняет экранированные HTML-версии текста и превью."""
+        self.text_html = linebreaks(self.text, autoescape=True)
+        self.preview_html = linebreaks(
+            Truncator(self.text).chars(PREVIEW_LENGTH),
+            autoescape=True
+        )
+
+    def save(self, *args, **kwargs):
+        self.render_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {
+                *update_fields, 'text_html', 'preview_html'
+            }
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ['-pub_date', ]
+        # id разрешает равные даты, как и курсоры подгрузки ленты
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+        ]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Имя файла', max_length=100, unique=True)
+    refs = models.PositiveIntegerField('Ссылки', default=0)
+
+    def __str__(self):
+        return self.name
 
 
 class Comment(models.Model):
@@ -55,9 +117,11 @@ class Comment(models.Model):
         'Текст комментария',
         help_text='Введите текст комментария'
     )
+    # Индекс для пакетных задач, читающих свежие комментарии
     created = models.DateTimeField(
         'Дата публикации',
-        auto_now_add=True
+        auto_now_add=True,
+        db_index=True
     )
     author = models.ForeignKey(
         User,
@@ -82,3 +146,103 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+    created = models.DateTimeField(
+        'Дата подписки',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+        # Под курсоры списков подписчиков и подписок
+        indexes = [
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='follow_followers_idx'
+            ),
+            models.Index(
+                fields=['user', '-created', '-id'],
+                name='follow_following_idx'
+            ),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """Кандидат в подписки, посчитанный пакетной задачей по графу."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ['-score', 'id']
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='suggestion_user_score_idx'
+            ),
+        ]
+
+
+class PostVector(models.Model):
+    """Частоты слов поста для расчёта похожих постов."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vector'
+    )
+    terms = models.TextField('Частоты слов в JSON', default='{}')
+    stale = models.BooleanField(
+        'Нужно пересчитать',
+        default=True,
+        db_index=True
+    )
+
+
+class RelatedPost(models.Model):
+    """Похожий пост, посчитанный по TF-IDF пакетной задачей."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_posts'
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ['-score', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', '-score'],
+                name='related_post_score_idx'
+            ),
+        ]
+
+
+class TrendingPost(models.Model):
+    """Место поста в популярном, посчитанное пакетной задачей."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending'
+    )
+    rank = models.PositiveIntegerField('Место', unique=True)
+    score = models.FloatField('Оценка')
@@ -0,0 +1,188 @@
+"""Похожие посты по TF-IDF.
+
+При создании и правке поста его частоты слов сохраняются в PostVector
+с пометкой stale, а фоновая задача пересчитывает соседей всех
+помеченных постов, читая корпус один раз на запуск. Векторы
+разреженные: вес слова (1 + log tf) * idf, нормированный по длине, так
+что скалярное произведение - косинусное сходство. Сходство с одним
+постом считается через обратный индекс слово -> посты, то есть только
+по постам с общими словами.
+
+Лучшие TOP_K соседей сохраняются в RelatedPost, и страница поста
+получает их одним запросом по индексу (post, -score).
+"""
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import Post, PostVector, RelatedPost
+
+TOP_K = 5
+# Соседи со сходством ниже порога не показываются
+MIN_SCORE = 0.05
+# Слова, которые есть больше чем в такой доле постов, не учитываются:
+# веса у них почти нулевые, а списки в обратном индексе самые длинные
+MAX_DOCUMENT_RATIO = 0.5
+TOKEN_RE = re.compile(r'\w{3,}')
+# Сколько ждать после правки поста, чтобы в пачку попали и соседние
+BATCH_DELAY = 30
+STALE_BATCH = 200
+WRITE_BATCH = 500
+READ_CHUNK = 2000
+
+
+def term_counts(text):
+    return Counter(
+        token for token in TOKEN_RE.findall(text.lower())
+        if not token.isdigit()
+    )
+
+
+def index_post(post):
+    """Сохраняет частоты слов поста и ставит его в очередь пересчёта."""
+    PostVector.objects.update_or_create(
+        post=post,
+        defaults={'terms': json.dumps(term_counts(post.text)),
+                  'stale': True}
+    )
+
+
+def load_corpus():
+    """Читает частоты слов всех постов и строит векторы и индекс."""
+    counts = {}
+    rows = PostVector.objects.order_by().values_list('post_id', 'terms')
+    for post_id, terms in rows.iterator(READ_CHUNK):
+        counts[post_id] = json.loads(terms)
+    documents = Counter()
+    for terms in counts.values():
+        documents.update(terms.keys())
+    total = len(counts)
+    idf = {
+        term: math.log(total / count)
+        for term, count in documents.items()
+        if count <= total * MAX_DOCUMENT_RATIO
+    }
+    vectors = {}
+    postings = defaultdict(list)
+    for post_id, terms in counts.items():
+        vector = {
+            term: (1 + math.log(count)) * idf[term]
+            for term, count in terms.items() if term in idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if not norm:
+            continue
+        for term in vector:
+            vector[term] /= norm
+            postings[term].append((post_id, vector[term]))
+        vectors[post_id] = vector
+    return vectors, postings
+
+
+def neighbours(post_id, vectors, postings):
+    """Возвращает TOP_K пар (сходство, пост) для одного поста."""
+    scores = defaultdict(float)
+    for term, weight in vectors.get(post_id, {}).items():
+        for other_id, other_weight in postings[term]:
+            scores[other_id] += weight * other_weight
+    scores.pop(post_id, None)
+    return heapq.nlargest(TOP_K, (
+        (score, other_id) for other_id, score in scores.items()
+        if score >= MIN_SCORE
+    ))
+
+
+def save_neighbours(found):
+    """Заменяет соседей постов пачками по WRITE_BATCH.
+
+    found - словарь пост -> результат neighbours().
+    """
+    post_ids = list(found)
+    for start in range(0, len(post_ids), WRITE_BATCH):
+        batch = post_ids[start:start + WRITE_BATCH]
+        related = [
+            RelatedPost(post_id=post_id, related_id=related_id, score=score)
+            for post_id in batch
+            for score, related_id in found[post_id]
+        ]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id__in=batch).delete()
+            RelatedPost.objects.bulk_create(related)
+
+
+def update_stale():
+    """Пересчитывает соседей всех изменившихся постов.
+
+    Корпус читается один раз на запуск, а посты обрабатываются пачками
+    по STALE_BATCH. Кроме самих постов пересчитываются их новые и
+    прежние соседи: изменившийся пост мог войти в их списки или выпасть
+    из них. Возвращает число обработанных изменившихся постов.
+    """
+    stale = list(
+        PostVector.objects.filter(stale=True).values_list('post_id', flat=True)
+    )
+    if not stale:
+        return 0
+    batches = [
+        stale[start:start + STALE_BATCH]
+        for start in range(0, len(stale), STALE_BATCH)
+    ]
+    # Пометка снимается до чтения корпуса: если пост поправят во время
+    # расчёта, он снова станет stale и попадёт в следующий запуск
+    for batch in batches:
+        PostVector.objects.filter(post_id__in=batch).update(stale=False)
+    vectors, postings = load_corpus()
+    for batch in batches:
+        found = {
+            post_id: neighbours(post_id, vectors, postings)
+            for post_id in batch
+        }
+        affected = set(
+            RelatedPost.objects.filter(related_id__in=batch)
+            .values_list('post_id', flat=True)
+        )
+        for post_neighbours in found.values():
+            affected.update(related_id for _, related_id in post_neighbours)
+        affected.difference_update(found)
+        for post_id in affected:
+            found[post_id] = neighbours(post_id, vectors, postings)
+        save_neighbours(found)
+    return len(stale)
+
+
+def rebuild():
+    """Индексирует посты без векторов и пересчитывает всех соседей."""
+    missing = list(
+        Post.objects.filter(vector__isnull=True)
+        .values_list('pk', flat=True)
+    )
+    for start in range(0, len(missing), WRITE_BATCH):
+        texts = Post.objects.filter(
+            pk__in=missing[start:start + WRITE_BATCH]
+        ).values_list('pk', 'text')
+        PostVector.objects.bulk_create(
+            PostVector(post_id=post_id, terms=json.dumps(term_counts(text)),
+                       stale=False)
+            for post_id, text in texts
+        )
+    PostVector.objects.filter(stale=True).update(stale=False)
+    vectors, postings = load_corpus()
+    post_ids = PostVector.objects.values_list('post_id', flat=True)
+    found = {
+        post_id: neighbours(post_id, vectors, postings)
+        for post_id in post_ids.iterator(READ_CHUNK)
+    }
+    save_neighbours(found)
+    return len(found)
+
+
+def related_for(post, limit=TOP_K):
+    """Похожие посты одним запросом по индексу."""
+    return post.related_posts.select_related('related__author').only(
+        'post', 'related', 'related__text', 'related__author__username',
+        'related__author__first_name', 'related__author__last_name'
+    )[:limit]
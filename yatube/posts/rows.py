@@ -0,0 +1,202 @@
+"""Лёгкие объекты-строки для лент постов.
+
+Списки постов не создают полноценные экземпляры моделей Post и User:
+из базы выбираются только колонки, которые нужны шаблонам, и
+раскладываются в компактные объекты со __slots__. Полный текст поста
+страницам не нужен (им хватает preview_html): экспорт и RSS-ленты
+выбирают его через TEXT_ROW_FIELDS, а в остальных строках он
+дочитывается отдельным запросом при первом обращении. Группы в ленте
+повторяются, поэтому для них создаётся один урезанный экземпляр Group
+на группу (как при .only()), общий для всех строк.
+"""
+from django.core.files.storage import default_storage
+
+from .models import Group, Post, User
+
+POST_ROW_FIELDS = (
+    'id',
+    'preview_html',
+    'pub_date',
+    'image',
+    'placeholder',
+    'views',
+    'author_id',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group_id',
+    'group__slug',
+    'group__title',
+)
+# Текст - последним: from_values() отличает выборки по длине кортежа
+TEXT_ROW_FIELDS = POST_ROW_FIELDS + ('text',)
+# Порядок совпадает с порядком полей модели, как требует from_db()
+GROUP_ROW_FIELDS = ('id', 'title', 'slug')
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class Row:
+    """Базовая строка: сравнивается с экземплярами модели по pk."""
+    __slots__ = ()
+    model = None
+
+    def __eq__(self, other):
+        if isinstance(other, (type(self), self.model)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.model, self.pk))
+
+    def __repr__(self):
+        return f'<{type(self).__name__}: {self.pk}>'
+
+
+class AuthorRow(Row):
+    __slots__ = ('pk', 'username', 'first_name', 'last_name')
+    model = User
+
+    def __init__(self, pk, username, first_name, last_name):
+        self.pk = pk
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+
+    def __str__(self):
+        return self.username
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+class PostRow(Row):
+    __slots__ = (
+        'pk', '_text', 'preview_html', 'pub_date', 'image', 'placeholder',
+        'views', 'author', 'group'
+    )
+    model = Post
+
+    def __init__(self, pk, text, preview_html, pub_date, image, placeholder,
+                 views, author, group):
+        self.pk = pk
+        # None - текст не выбран вместе со строкой
+        self._text = text
+        self.preview_html = preview_html
+        self.pub_date = pub_date
+        # Имя файла в хранилище: sorl.thumbnail принимает его как есть
+        self.image = image
+        self.placeholder = placeholder
+        self.views = views
+        self.author = author
+        self.group = group
+
+    @property
+    def id(self):
+        return self.pk
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = Post.objects.filter(pk=self.pk).values_list(
+                'text', flat=True
+            ).first() or ''
+        return self._text
+
+    def __str__(self):
+        return self.text[:15]
+
+    @classmethod
+    def from_values(cls, values, groups):
+        """Собирает строку из кортежа в порядке POST_ROW_FIELDS.
+
+        Для TEXT_ROW_FIELDS в конце кортежа текст, иначе он дочитается
+        при обращении.
+        groups - словарь уже созданных групп по id, общий для выборки.
+        """
+        (pk, preview_html, pub_date, image, placeholder, views,
+         author_id, username, first_name, last_name, group_id, slug,
+         title, *text) = values
+        text = text[0] if text else None
+        group = None
+        if group_id is not None:
+            group = groups.get(group_id)
+            if group is None:
+                group = groups[group_id] = Group.from_db(
+                    None, GROUP_ROW_FIELDS, (group_id, title, slug)
+                )
+        return cls(
+            pk, text, preview_html, pub_date, image, placeholder, views,
+            AuthorRow(author_id, username, first_name, last_name),
+            group,
+        )
+
+    def as_dict(self):
+        """Представление строки для экспорта."""
+        return {
+            'id': self.pk,
+            'text': self.text,
+            'pub_date': self.pub_date.isoformat(),
+            'image': default_storage.url(self.image) if self.image else None,
+            'views': self.views,
+            'author': self.author.username,
+            'group': self.group.slug if self.group else None,
+        }
+
+
+class PostRows:
+    """Последовательность PostRow поверх QuerySet постов.
+
+    Поддерживает count() и срезы, поэтому её можно отдавать в Paginator:
+    на страницу выполняется один запрос values_list() с join автора
+    и группы вместо создания моделей и отдельных запросов на связи.
+    """
+
+    def __init__(self, queryset, fields=POST_ROW_FIELDS):
+        self.queryset = queryset
+        self.fields = fields
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        values = self.queryset.values_list(*self.fields)[key]
+        if isinstance(key, slice):
+            groups = {}
+            return [PostRow.from_values(row, groups) for row in values]
+        return PostRow.from_values(values, {})
+
+    def __iter__(self):
+        values = self.queryset.values_list(*self.fields)
+        groups = {}
+        for row in values.iterator(ITERATOR_CHUNK_SIZE):
+            yield PostRow.from_values(row, groups)
+
+
+class PageRows:
+    """Готовые строки одной страницы вместо выборки из базы.
+
+    Хранит общее число строк и строки страницы, начинающейся с offset:
+    Paginator строит из неё ту же страницу без запросов, если
+    запрашивается именно она.
+    """
+
+    def __init__(self, count, offset, rows):
+        self._count = count
+        self.offset = offset
+        self.rows = rows
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        return self.rows[key.start - self.offset:key.stop - self.offset]
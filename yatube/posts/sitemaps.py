@@ -0,0 +1,178 @@
+"""Карта сайта в статических файлах.
+
+Посты, профили и группы пишутся в файлы по URLS_PER_FILE адресов
+(предел протокола sitemap) одним потоковым проходом iterator() по
+возрастанию id, так что память не зависит от размера таблиц. Каждый
+файл покрывает диапазон id (after, last]; диапазоны хранятся в
+STATE_FILE. Повторный запуск начинает с последнего неполного файла
+и дописывает только новые строки, полные файлы не трогает.
+"""
+import json
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+from .models import Group, Post, User
+
+URLS_PER_FILE = 50000
+READ_CHUNK = 2000
+INDEX_FILE = 'sitemap.xml'
+STATE_FILE = 'sitemap-state.json'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def section_rows(model, after):
+    return model.objects.filter(pk__gt=after).order_by('pk')
+
+
+def post_urls(after):
+    rows = section_rows(Post, after)
+    for pk, pub_date in rows.values_list('pk', 'pub_date').iterator(
+        READ_CHUNK
+    ):
+        yield pk, reverse('posts:post_detail', args=(pk,)), pub_date
+
+
+def profile_urls(after):
+    rows = section_rows(User, after)
+    for pk, username in rows.values_list('pk', 'username').iterator(
+        READ_CHUNK
+    ):
+        yield pk, reverse('posts:profile', args=(username,)), None
+
+
+def group_urls(after):
+    rows = section_rows(Group, after)
+    for pk, slug in rows.values_list('pk', 'slug').iterator(READ_CHUNK):
+        yield pk, reverse('posts:group_list', args=(slug,)), None
+
+
+# Раздел: модель и генератор (id, путь, lastmod) для строк с id
+# больше after
+SECTIONS = {
+    'posts': (Post, post_urls),
+    'profiles': (User, profile_urls),
+    'groups': (Group, group_urls),
+}
+
+
+class SitemapFile:
+    """Один файл карты: пишется во временный и подменяет старый."""
+
+    def __init__(self, root, name, after):
+        self.path = os.path.join(root, name)
+        self.name = name
+        self.after = after
+        self.last = after
+        self.count = 0
+        self.lastmod = None
+        self.file = open(self.path + '.tmp', 'w', encoding='utf-8')
+        self.file.write(
+            f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<urlset xmlns="{XMLNS}">\n'
+        )
+
+    def add(self, pk, path, lastmod):
+        line = f'<url><loc>{escape(settings.SITE_URL + path)}</loc>'
+        if lastmod is not None:
+            line += f'<lastmod>{lastmod.isoformat()}</lastmod>'
+            self.lastmod = max(self.lastmod or lastmod, lastmod)
+        self.file.write(line + '</url>\n')
+        self.last = pk
+        self.count += 1
+
+    def close(self):
+        self.file.write('</urlset>\n')
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+        return {
+            'name': self.name,
+            'after': self.after,
+            'last': self.last,
+            'count': self.count,
+            'lastmod': self.lastmod and self.lastmod.isoformat(),
+        }
+
+
+def build_section(root, section, files):
+    """Дописывает раздел с места, где остановился прошлый запуск.
+
+    files - описания уже записанных файлов раздела; возвращает новые
+    описания и число записанных адресов.
+    """
+    model, urls = SECTIONS[section]
+    files = list(files)
+    after = 0
+    if files:
+        after = files[-1]['last']
+        if not section_rows(model, after).exists():
+            return files, 0
+        if files[-1]['count'] < URLS_PER_FILE:
+            # Неполный файл переписывается вместе с новыми строками
+            after = files.pop()['after']
+    current = None
+    written = 0
+    for pk, path, lastmod in urls(after):
+        if current is None or current.count == URLS_PER_FILE:
+            if current is not None:
+                files.append(current.close())
+            name = f'sitemap-{section}-{len(files) + 1}.xml'
+            current = SitemapFile(root, name, after)
+        current.add(pk, path, lastmod)
+        after = pk
+        written += 1
+    if current is not None:
+        files.append(current.close())
+    return files, written
+
+
+def write_index(root, state):
+    path = os.path.join(root, INDEX_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as index:
+        index.write(
+            f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<sitemapindex xmlns="{XMLNS}">\n'
+        )
+        base = settings.SITE_URL + settings.SITEMAP_URL
+        for files in state.values():
+            for sitemap in files:
+                line = f'<sitemap><loc>{escape(base + sitemap["name"])}</loc>'
+                if sitemap['lastmod']:
+                    line += f'<lastmod>{sitemap["lastmod"]}</lastmod>'
+                index.write(line + '</sitemap>\n')
+        index.write('</sitemapindex>\n')
+    os.replace(path + '.tmp', path)
+
+
+def build(full=False):
+    """Обновляет карту сайта, возвращает число записанных адресов."""
+    if not settings.SITE_URL:
+        raise ImproperlyConfigured(
+            'Карте сайта нужен адрес сайта: задайте переменную SITE_URL'
+        )
+    root = settings.SITEMAP_ROOT
+    os.makedirs(root, exist_ok=True)
+    state_path = os.path.join(root, STATE_FILE)
+    state = {}
+    if not full and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as state_file:
+            state = json.load(state_file)
+    written = 0
+    for section in SECTIONS:
+        state[section], section_written = build_section(
+            root, section, state.get(section, [])
+        )
+        written += section_written
+    write_index(root, state)
+    with open(state_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    # Файлы, которых больше нет в карте (после --full или удалений)
+    names = {sitemap['name'] for files in state.values() for sitemap in files}
+    for name in os.listdir(root):
+        if name.startswith('sitemap-') and name.endswith('.xml') \
+                and name not in names:
+            os.remove(os.path.join(root, name))
+    return written
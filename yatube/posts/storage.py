@@ -0,0 +1,74 @@
+"""Хранилище картинок, адресуемое содержимым.
+
+Имя файла - sha256 его байтов, поэтому одна и та же картинка,
+загруженная много раз, лежит на диске один раз, а sorl.thumbnail,
+который строит ключ миниатюры по имени источника, делит её миниатюры
+между всеми постами. Хеш считается по ходу записи во временный файл
+рядом с целевым: загрузка читается один раз и не держится в памяти.
+Файлы раскладываются по вложенным каталогам из первых символов хеша
+(posts/ab/cd/abcd....jpg), чтобы ни в одном каталоге не собирались
+миллионы записей.
+Сколько постов ссылаются на файл, считает posts.blobs.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+DEFAULT_PERMISSIONS = 0o644
+
+
+def content_name(directory, digest, ext):
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], digest + ext.lower()
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имени - это совпадение содержимого, а не конфликт
+        return name
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = content_name(
+                directory, digest.hexdigest(), os.path.splitext(basename)[1]
+            )
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                # Файл уже есть: свежее время изменения защищает его от
+                # сборщика мусора, пока пост с ним не сохранён
+                os.utime(full_path)
+            except FileNotFoundError:
+                # mkstemp создаёт файл с правами 0600
+                os.chmod(
+                    temp_path,
+                    self.file_permissions_mode or DEFAULT_PERMISSIONS
+                )
+                # Одновременные загрузки одной картинки пишут одни и те же
+                # байты, так что кто заменит файл последним - неважно
+                os.replace(temp_path, full_path)
+            else:
+                os.remove(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+image_storage = ContentAddressedStorage()
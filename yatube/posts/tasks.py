@@ -0,0 +1,71 @@
+from core.jobs import enqueue_unique, task
+
+from . import images, related, trending
+from .models import Post, PostVector
+from .suggestions import compute_suggestions
+
+# Как часто пересчитывается популярное
+TRENDING_INTERVAL = 60 * 5
+# Как часто пересчитываются рекомендации подписок
+SUGGESTIONS_INTERVAL = 60 * 60 * 24
+
+
+@task(priority=10)
+def warm_thumbnails(post_id):
+    """Заранее строит кадры картинки поста и её заглушку."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None:
+        return
+    placeholder = ''
+    if post.image:
+        images.variants(post.image)
+        placeholder = images.placeholder(post.image)
+    # update(): сохранение поста из задачи затёрло бы правки автора
+    Post.objects.filter(pk=post_id).update(placeholder=placeholder)
+
+
+@task(priority=-10, max_attempts=1)
+def compute_follow_suggestions():
+    """Пересчитывает рекомендации подписок и ставит следующий пересчёт.
+
+    Первый запуск планирует подписка (schedule_suggestions), дальше
+    задача ставит себя раз в SUGGESTIONS_INTERVAL.
+    """
+    try:
+        compute_suggestions()
+    finally:
+        # Одна попытка: упавший расчёт не должен снимать расписание
+        schedule_suggestions()
+
+
+def schedule_suggestions():
+    """Ставит пересчёт рекомендаций, если он ещё не запланирован."""
+    enqueue_unique(compute_follow_suggestions, delay=SUGGESTIONS_INTERVAL)
+
+
+@task(priority=-5)
+def update_related_posts():
+    """Пересчитывает похожие посты для изменившихся постов.
+
+    Одна задача в очереди на любое число правок; если посты поправили
+    во время расчёта, задача ставит себя снова.
+    """
+    related.update_stale()
+    if PostVector.objects.filter(stale=True).exists():
+        enqueue_unique(update_related_posts)
+
+
+@task(priority=-5)
+def rank_trending_posts():
+    """Пересчитывает ленту популярного и ставит следующий пересчёт.
+
+    Без записей на сайте посты всё равно выходят из окна WINDOW, поэтому
+    задача планирует себя сама, а не ждёт нового поста или комментария.
+    """
+    trending.rank()
+    schedule_trending()
+
+
+def schedule_trending():
+    """Ставит пересчёт популярного, если он ещё не запланирован."""
+    enqueue_unique(rank_trending_posts, delay=TRENDING_INTERVAL)
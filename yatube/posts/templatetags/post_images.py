@@ -0,0 +1,39 @@
+from django import template
+
+from .. import images
+from ..storage import image_storage
+
+register = template.Library()
+
+
+def srcset(urls):
+    return ', '.join(f'{url} {width}w' for url, width in urls)
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    """Картинка поста со srcset, ленивой загрузкой и заглушкой.
+
+    Кадры здесь не строятся: пока задача warm_thumbnails их не сделала,
+    выводится исходная картинка без srcset.
+    """
+    if not post.image:
+        return {}
+    stored = images.stored_variants(post.image)
+    if stored is None:
+        return {
+            'src': image_storage.url(getattr(post.image, 'name', post.image)),
+            'width': images.THUMBNAIL_SIZE[0],
+            'height': images.THUMBNAIL_SIZE[1],
+            'placeholder': post.placeholder,
+        }
+    *sources, (_, fallback) = stored
+    return {
+        'sources': [(mime, srcset(urls)) for mime, urls in sources],
+        'srcset': srcset(fallback),
+        # Самый широкий кадр - для браузеров без srcset
+        'src': fallback[-1][0],
+        'width': images.THUMBNAIL_SIZE[0],
+        'height': images.THUMBNAIL_SIZE[1],
+        'placeholder': post.placeholder,
+    }
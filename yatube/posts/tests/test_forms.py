@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from django.core.cache import cache
@@ -7,7 +8,9 @@ from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from .. import counters
 from ..models import Comment, Group, Post
+from ..storage import content_name
 
 User = get_user_model()
 
@@ -48,6 +51,8 @@ class FormTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
         self.authorized_client = Client()
         self.authorized_client.force_login(FormTest.user)
 
@@ -88,7 +93,9 @@ class FormTest(TestCase):
             Post.objects.filter(
                 text='Тестовый текст',
                 group=self.group.pk,
-                image='posts/small.gif',
+                image=content_name(
+                    'posts', hashlib.sha256(small_gif).hexdigest(), '.gif'
+                ),
             ).exists(),
             'Не создалась запись с изображением!'
         )
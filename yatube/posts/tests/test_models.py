@@ -1,10 +1,38 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Group, Post
+from .. import blobs, media_gc
+from ..models import PREVIEW_LENGTH, Group, ImageBlob, Post
+from ..storage import content_name
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+SMALL_GIF_NAME = content_name(
+    'posts', hashlib.sha256(SMALL_GIF).hexdigest(), '.gif'
+)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -32,3 +60,206 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         expected_title = group.title
         self.assertEqual(expected_title, str(group), 'что-то не так')
+
+    def test_models_post_text_rendered_on_save(self):
+        """Проверяем, что HTML-версии текста поста считаются при save."""
+        post = Post.objects.create(
+            author=PostModelTest.user,
+            text='<b>Первый</b> абзац\n\nВторой абзац ' + 'х' * PREVIEW_LENGTH,
+        )
+        self.assertTrue(
+            post.text_html.startswith('<p>&lt;b&gt;Первый&lt;/b&gt; абзац</p>')
+        )
+        self.assertIn('<p>Второй абзац', post.text_html)
+        self.assertLess(len(post.preview_html), len(post.text_html))
+        post.text = 'Новый текст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>Новый текст</p>')
+        self.assertEqual(post.preview_html, '<p>Новый текст</p>')
+
+
+# Колбэки on_commit в TestCase не вызываются, выполняем их сразу
+@mock.patch('posts.blobs.transaction.on_commit', lambda func: func())
+class ImageBlobTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Свой каталог на тест: файлы не откатываются вместе с базой
+        self.media_root = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, content=SMALL_GIF, name='meme.GIF'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def age(self, name):
+        """Состаривает файл: удалять можно только файлы старше UPLOAD_GRACE"""
+        old = time.time() - blobs.UPLOAD_GRACE - 1
+        os.utime(self.path(name), (old, old))
+
+    def test_same_upload_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом с именем по sha256"""
+        first = self.upload()
+        second = self.upload(name='other.gif')
+        self.assertEqual(first.image.name, SMALL_GIF_NAME)
+        self.assertEqual(second.image.name, SMALL_GIF_NAME)
+        self.assertEqual(ImageBlob.objects.get(name=SMALL_GIF_NAME).refs, 2)
+        stored = [
+            entry.name for entry in media_gc.scan(self.path('posts'))
+        ]
+        self.assertEqual(stored, [os.path.basename(SMALL_GIF_NAME)])
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется только вместе с последним постом"""
+        first = self.upload()
+        second = self.upload()
+        name = first.image.name
+        first.delete()
+        self.assertTrue(os.path.exists(self.path(name)))
+        self.age(name)
+        second.delete()
+        self.assertFalse(os.path.exists(self.path(name)))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Замена картинки при правке освобождает старый файл"""
+        post = self.upload()
+        old = post.image.name
+        self.age(old)
+        post.image = SimpleUploadedFile('new.gif', SMALL_GIF + b'\x00')
+        post.save()
+        self.assertNotEqual(post.image.name, old)
+        self.assertFalse(os.path.exists(self.path(old)))
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name).refs, 1)
+
+    def test_collect_keeps_reuploaded_image(self):
+        """Повторная загрузка защищает файл от сборщика мусора"""
+        path = self.path(self.upload().image.name)
+        Post.objects.all().delete()
+        hour_ago = time.time() - 60 * 60
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(SMALL_GIF)
+        os.utime(path, (hour_ago, hour_ago))
+        stale = list(media_gc.old_files('posts', time.time() - 60))
+        self.assertEqual(stale, [(SMALL_GIF_NAME, len(SMALL_GIF))])
+        self.upload()
+        self.assertGreater(os.stat(path).st_mtime, hour_ago)
+        self.assertFalse(
+            media_gc.remove_image(SMALL_GIF_NAME, time.time() - 60)
+        )
+        self.assertTrue(os.path.exists(path))
+
+    def test_fresh_file_survives_release(self):
+        """Свежий файл без ссылки не удаляется: его могут загружать"""
+        post = self.upload()
+        name = post.image.name
+        post.delete()
+        self.assertTrue(os.path.exists(self.path(name)))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.age(name)
+        blobs.delete_file(name)
+        self.assertFalse(os.path.exists(self.path(name)))
+
+    def test_acquire_revives_released_blob(self):
+        """Новая ссылка на запись с refs=0 не даёт удалить файл"""
+        blob = ImageBlob.objects.create(name=SMALL_GIF_NAME, refs=0)
+        blobs.acquire(SMALL_GIF_NAME)
+        self.assertEqual(ImageBlob.objects.get(pk=blob.pk).refs, 1)
+
+    def test_acquire_retries_concurrent_create(self):
+        """Гонка за создание записи повторяется, а не теряет ссылку"""
+        create = ImageBlob.objects.create
+        calls = []
+
+        def racing_create(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError
+            return create(**kwargs)
+
+        with mock.patch.object(
+            ImageBlob.objects, 'create', side_effect=racing_create
+        ):
+            blobs.acquire(SMALL_GIF_NAME)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ImageBlob.objects.get(name=SMALL_GIF_NAME).refs, 1)
+
+    def test_adopt_legacy_files(self):
+        """Старые файлы переименовываются по содержимому и склеиваются"""
+        legacy = FileSystemStorage(location=self.media_root)
+        names = [
+            legacy.save('posts/old.gif', ContentFile(SMALL_GIF))
+            for _ in range(2)
+        ]
+        posts = [
+            Post.objects.create(author=self.user, text='Старый', image=name)
+            for name in names
+        ]
+        for blob in blobs.legacy_blobs():
+            blobs.adopt(blob)
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, SMALL_GIF_NAME)
+        self.assertEqual(ImageBlob.objects.get().refs, 2)
+        for old in names:
+            self.assertFalse(os.path.exists(self.path(old)))
+
+    def test_relocate_flat_files(self):
+        """Файлы с плоскими именами переносятся во вложенные каталоги"""
+        legacy = FileSystemStorage(location=self.media_root)
+        flat = legacy.save(
+            f'posts/{os.path.basename(SMALL_GIF_NAME)}',
+            ContentFile(SMALL_GIF)
+        )
+        old = legacy.save('posts/old.gif', ContentFile(SMALL_GIF + b'\x00'))
+        for name in (flat, old):
+            Post.objects.create(author=self.user, text='Старый', image=name)
+        moved, missing = blobs.relocate(blobs.misplaced_blobs(), workers=2)
+        self.assertEqual((moved, missing), (2, 0))
+        self.assertFalse(list(blobs.misplaced_blobs()))
+        for name in Post.objects.values_list('image', flat=True):
+            self.assertEqual(blobs.layout_name(name), name)
+            self.assertTrue(os.path.exists(self.path(name)))
+        for name in (flat, old):
+            self.assertFalse(os.path.exists(self.path(name)))
+
+    def test_collect_unreferenced_files(self):
+        """Сборщик удаляет старые файлы без ссылок и не трогает свежие"""
+        post = self.upload()
+        thumbnail = get_thumbnail(post.image, '10x10').name
+        orphans = ['posts/ab/cd/orphan.gif', 'cache/ab/cd/orphan.jpg']
+        fresh = 'posts/fresh.gif'
+        for name in [*orphans, fresh]:
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            with open(self.path(name), 'wb') as file:
+                file.write(SMALL_GIF)
+        hour_ago = time.time() - 60 * 60
+        for name in [*orphans, post.image.name, thumbnail]:
+            os.utime(self.path(name), (hour_ago, hour_ago))
+        found = media_gc.collect(grace=60, dry_run=True)
+        self.assertEqual(found['images'], (1, len(SMALL_GIF)))
+        self.assertTrue(os.path.exists(self.path(orphans[0])))
+        found = media_gc.collect(grace=60)
+        self.assertEqual(found['thumbnails'], (1, len(SMALL_GIF)))
+        for name in orphans:
+            self.assertFalse(os.path.exists(self.path(name)))
+        self.assertTrue(os.path.exists(self.path(fresh)))
+        self.assertTrue(os.path.exists(self.path(post.image.name)))
+        self.assertTrue(os.path.exists(self.path(thumbnail)))
@@ -31,6 +31,7 @@ class PaginatorTests(TestCase):
             )
 
     def setUp(self):
+        self.guest_client = Client()
         self.user = User.objects.create_user(username='NoName')
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -61,3 +62,47 @@ class PaginatorTests(TestCase):
             with self.subTest(page=page):
                 response = self.authorized_client.get(page + '?page=2')
                 self.assertEqual(len(response.context.get('page_obj')), 3)
+
+    def test_fragments_follow_cursor(self):
+        """Фрагменты подгружают посты после курсора без повторов"""
+        pages = [
+            reverse('posts:index_fragments'),
+            reverse(
+                'posts:group_fragments', args=[PaginatorTests.group.slug]
+            ),
+            reverse('posts:profile_fragments', args=[PaginatorTests.user]),
+        ]
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                first = list(response.context.get('page_obj'))
+                self.assertEqual(len(first), 10)
+                self.assertNotContains(response, '<html')
+                cursor = response['X-Next-Cursor']
+                response = self.guest_client.get(page, {'cursor': cursor})
+                second = list(response.context.get('page_obj'))
+                self.assertEqual(len(second), 3)
+                self.assertFalse(response.has_header('X-Next-Cursor'))
+                self.assertFalse(set(first) & set(second))
+
+    def test_fragments_continue_page(self):
+        """Курсор страницы продолжает её следующими постами"""
+        response = self.guest_client.get(reverse('posts:index'))
+        page_posts = list(response.context.get('page_obj'))
+        response = self.guest_client.get(
+            reverse('posts:index_fragments'),
+            {'cursor': response.context.get('next_cursor')}
+        )
+        next_posts = list(response.context.get('page_obj'))
+        response = self.guest_client.get(
+            reverse('posts:index') + '?page=2'
+        )
+        self.assertEqual(next_posts, list(response.context.get('page_obj')))
+        self.assertFalse(set(page_posts) & set(next_posts))
+
+    def test_fragments_bad_cursor(self):
+        """Испорченный курсор даёт 400"""
+        response = self.guest_client.get(
+            reverse('posts:index_fragments'), {'cursor': 'испорчен'}
+        )
+        self.assertEqual(response.status_code, 400)
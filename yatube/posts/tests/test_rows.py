@@ -0,0 +1,79 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Group, Post
+from ..rows import TEXT_ROW_FIELDS, PageRows, PostRow, PostRows
+
+User = get_user_model()
+
+
+class PostRowsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Полный текст поста {i}',
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+
+    def test_page_rows_without_text(self):
+        """Страница ленты - один запрос без колонки полного текста"""
+        rows = PostRows(Post.objects.all())
+        with CaptureQueriesContext(connection) as context:
+            page = rows[1:4]
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('"text"', context.captured_queries[0]['sql'])
+        self.assertEqual(len(page), 3)
+        self.assertEqual(page[0].author.get_full_name(), 'Лев Толстой')
+        text = Post.objects.all()[1].text
+        with self.assertNumQueries(1):
+            self.assertEqual(page[0].text, text)
+
+    def test_rows_share_groups(self):
+        """Строки одной выборки делят экземпляр группы"""
+        grouped = [row for row in PostRows(Post.objects.all()) if row.group]
+        self.assertEqual(len(grouped), 2)
+        self.assertIs(grouped[0].group, grouped[1].group)
+        self.assertEqual(grouped[0].group.slug, self.group.slug)
+
+    def test_text_rows(self):
+        """TEXT_ROW_FIELDS добавляют полный текст"""
+        row = PostRows(Post.objects.all(), TEXT_ROW_FIELDS)[0]
+        self.assertIsInstance(row, PostRow)
+        text = Post.objects.all()[0].text
+        with self.assertNumQueries(0):
+            self.assertEqual(row.text, text)
+
+    def test_page_rows_paginate_without_queries(self):
+        """PageRows отдаёт Paginator сохранённую страницу"""
+        rows = PostRows(Post.objects.all())[2:4]
+        with self.assertNumQueries(0):
+            page = Paginator(PageRows(5, 2, rows), 2).page(2)
+            self.assertEqual(list(page), rows)
+            self.assertEqual(page.paginator.num_pages, 3)
+
+    def test_export_posts(self):
+        """Экспорт выдаёт по строке JSON на пост с полным текстом"""
+        out = StringIO()
+        call_command('export_posts', '--group', self.group.slug, stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]['text'], self.posts[3].text)
+        self.assertEqual(lines[0]['author'], self.author.username)
+        self.assertEqual(lines[0]['group'], self.group.slug)
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client
+from .. import counters
 from ..models import Comment, Post, Group
 from http import HTTPStatus
 
@@ -27,6 +28,8 @@ class PostURLTest(TestCase):
         )
 
     def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
         self.guest_client = Client()
         self.user = User.objects.create_user(username='testauthor')
         self.authorized_client = Client()
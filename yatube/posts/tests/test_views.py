@@ -1,14 +1,33 @@
+import io
+import json
+import os
 import shutil
 import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from sorl.thumbnail import default
 
-from ..models import Comment, Follow, Group, Post
+from core.jobs import enqueue, work
+from core.models import Job
+
+from .. import (counters, events, images, lookups, related, sitemaps,
+                suggestions, tasks, trending, versions, views)
+from ..models import Comment, Follow, Group, Post, PostVector, TrendingPost
 
 User = get_user_model()
 
@@ -57,6 +76,8 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
         self.guest_client = Client()
         self.user = User.objects.create_user(username='NoName')
         self.authorized_client = Client()
@@ -260,6 +281,22 @@ class PostPagesTests(TestCase):
         # Проверяем, что кол-во подписок увеличилось
         self.assertEqual(Follow.objects.count(), follow_count + 1)
 
+    def test_follow_twice(self):
+        """Повторная подписка не создаёт дубликат"""
+        url = reverse('posts:profile_follow', args=[f'{PostPagesTests.user}'])
+        self.authorized_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertRedirects(
+            response,
+            reverse('posts:profile', args=[f'{PostPagesTests.user}'])
+        )
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.user, author=PostPagesTests.user
+            ).count(),
+            1
+        )
+
     def test_unfollow(self):
         """Авторизованный пользователь может отписываться
         от других пользователей
@@ -318,3 +355,811 @@ class PostPagesTests(TestCase):
             403,
             'Пользователь может подписаться на самого себя'
         )
+
+
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        lookups.groups.clear()
+        lookups.authors.clear()
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def test_group_lookup_cached(self):
+        """Группа по slug берётся из кеша после первого запроса"""
+        self.assertEqual(lookups.groups.get('test-slug'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(lookups.groups.get('test-slug'), self.group)
+
+    def test_lookup_invalidated_by_signals(self):
+        """Сохранение и удаление сбрасывают запись, в том числе 404"""
+        self.assertIsNone(lookups.authors.get('new_author'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(lookups.authors.get('new_author'))
+        author = User.objects.create_user(username='new_author')
+        self.assertEqual(lookups.authors.get('new_author'), author)
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertIsNone(lookups.groups.get('test-slug'))
+        self.group.delete()
+        self.assertIsNone(lookups.groups.get('new-slug'))
+
+    def test_lookup_cache_bounded(self):
+        """Размер кеша ограничен"""
+        cache = lookups.ObjectCache(Group, 'slug', maxsize=2)
+        for slug in ('a', 'b', 'test-slug'):
+            cache.get(slug)
+        self.assertEqual(len(cache._entries), 2)
+        self.assertNotIn('a', cache._entries)
+
+
+class EventsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.source = events.Broadcaster()
+        # Поток опроса не запускаем, опрашиваем вручную
+        self.source.start = lambda: None
+        self.source.poll()
+
+    def test_broadcaster_polls_new_posts_once(self):
+        """Новые посты читаются одним запросом для всех клиентов"""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Post.objects.create(author=self.user, text='Пост')
+        with self.assertNumQueries(1):
+            self.source.poll()
+        self.assertEqual(len(self.source.posts_since(0)), 2)
+
+    def test_event_stream_counts_matching_posts(self):
+        """Поток отдаёт число новых постов своей ленты"""
+        stream = events.event_stream(
+            None,
+            lambda author_id, group_id: group_id == self.group.pk,
+            source=self.source
+        )
+        self.assertIn('event: ready', next(stream))
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Post.objects.create(author=self.user, text='Пост')
+        self.source.poll()
+        message = next(stream)
+        self.assertIn('event: posts', message)
+        self.assertIn('"new": 1', message)
+
+    def test_events_disabled_by_default(self):
+        """Без POST_EVENTS ленты не открывают поток, эндпоинт - 404"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'EventSource')
+        response = self.client.get(reverse('posts:index_events'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(POST_EVENTS=True)
+    def test_events_endpoints(self):
+        """Эндпоинты событий отдают text/event-stream"""
+        urls = [
+            reverse('posts:index_events'),
+            reverse('posts:group_events', args=[self.group.slug]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response['Content-Type'], 'text/event-stream'
+                )
+        response = self.client.get(reverse('posts:follow_events'))
+        self.assertEqual(response.status_code, 302)
+
+
+class FollowListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{i}')
+            for i in range(3)
+        ]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+
+    def setUp(self):
+        lookups.authors.clear()
+
+    def test_followers_page(self):
+        """Страница подписчиков выводит их за постоянное число запросов"""
+        url = reverse('posts:followers', args=[self.author.username])
+        with self.assertNumQueries(2):
+            # Автор и страница подписок
+            response = self.client.get(url)
+        self.assertEqual(
+            set(response.context['users']), set(self.readers)
+        )
+
+    def test_following_page(self):
+        """Страница подписок выводит авторов"""
+        response = self.client.get(
+            reverse('posts:following', args=[self.readers[0].username])
+        )
+        self.assertEqual(response.context['users'], [self.author])
+
+    def test_followers_json_cursor(self):
+        """JSON подписчиков листается курсором"""
+        url = reverse('posts:followers_json', args=[self.author.username])
+        with mock.patch.object(views, 'LIMIT_FOLLOWS', 2):
+            first = self.client.get(url).json()
+            second = self.client.get(url, {'cursor': first['next']}).json()
+        usernames = [
+            user['username']
+            for user in first['results'] + second['results']
+        ]
+        self.assertEqual(
+            usernames, ['reader2', 'reader1', 'reader0']
+        )
+        self.assertIsNone(second['next'])
+
+
+class SuggestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.author, cls.other, cls.fan = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'author', 'other', 'fan')
+        ]
+        # reader -> friend -> author: друг друга
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.author)
+        # fan тоже читает friend и ещё other: со-подписка
+        Follow.objects.create(user=cls.fan, author=cls.friend)
+        Follow.objects.create(user=cls.fan, author=cls.other)
+
+    def test_suggestions_computed_from_graph(self):
+        """Пакетный расчёт находит друзей друзей и со-подписки"""
+        suggestions.compute_suggestions()
+        suggested = [
+            suggestion.author
+            for suggestion in suggestions.suggestions_for(self.reader)
+        ]
+        self.assertEqual(suggested, [self.author, self.other])
+
+    def test_suggestions_served_in_one_query(self):
+        """Панель рекомендаций - один запрос, подписки исключены"""
+        suggestions.compute_suggestions()
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertNumQueries(1):
+            suggested = [
+                suggestion.author.username
+                for suggestion in suggestions.suggestions_for(self.reader)
+            ]
+        self.assertEqual(suggested, ['other'])
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'На кого подписаться')
+
+    def test_follow_schedules_daily_recompute(self):
+        """Подписка планирует пересчёт, а он - следующий"""
+        client = Client()
+        client.force_login(self.reader)
+        client.get(reverse('posts:profile_follow', args=('other',)))
+        jobs = Job.objects.filter(
+            name=tasks.compute_follow_suggestions.job_name,
+            status=Job.QUEUED,
+        )
+        jobs.update(run_at=timezone.now())
+        start = timezone.now()
+        self.assertTrue(work('worker'))
+        self.assertTrue(
+            suggestions.suggestions_for(self.reader).exists()
+        )
+        self.assertGreaterEqual(
+            jobs.get().run_at,
+            start + timedelta(seconds=tasks.SUGGESTIONS_INTERVAL)
+        )
+
+
+class RelatedPostTests(TestCase):
+    TEXTS = (
+        'Кошки любят рыбу и молоко',
+        'Кошки едят рыбу каждый день',
+        'Футбол вчера закончился вничью',
+        'Погода сегодня солнечная',
+    )
+
+    def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
+        self.user = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+        for text in self.TEXTS:
+            self.client.post(reverse('posts:post_create'), {'text': text})
+        self.cats, self.fish, self.football, _ = [
+            Post.objects.get(text=text) for text in self.TEXTS
+        ]
+
+    def related_texts(self, post):
+        return [item.related.text for item in related.related_for(post)]
+
+    def test_new_posts_indexed_in_batch(self):
+        """Новые посты пересчитываются одной пачкой задачи"""
+        self.assertEqual(PostVector.objects.filter(stale=True).count(), 4)
+        self.assertEqual(related.update_stale(), 4)
+        self.assertEqual(related.update_stale(), 0)
+        self.assertEqual(self.related_texts(self.cats), [self.fish.text])
+        self.assertEqual(self.related_texts(self.fish), [self.cats.text])
+        self.assertEqual(self.related_texts(self.football), [])
+
+    def test_one_job_for_many_edits(self):
+        """Правки ставят одну задачу, правка во время расчёта - следующую"""
+        jobs = Job.objects.filter(name=tasks.update_related_posts.job_name)
+        self.assertEqual(jobs.count(), 1)
+        jobs.delete()
+        load_corpus = related.load_corpus
+
+        def edited_during_run():
+            corpus = load_corpus()
+            related.index_post(self.cats)
+            return corpus
+
+        with mock.patch.object(related, 'load_corpus', edited_during_run):
+            tasks.update_related_posts()
+        self.assertEqual(PostVector.objects.filter(stale=True).count(), 1)
+        self.assertEqual(jobs.count(), 1)
+        jobs.delete()
+        tasks.update_related_posts()
+        self.assertFalse(jobs.exists())
+
+    def test_corpus_read_once_per_run(self):
+        """Корпус читается один раз на все пачки запуска"""
+        counted = mock.patch.object(
+            related, 'load_corpus', wraps=related.load_corpus
+        )
+        with mock.patch.object(related, 'STALE_BATCH', 3), \
+                counted as load_corpus:
+            self.assertEqual(related.update_stale(), 4)
+        load_corpus.assert_called_once()
+        self.assertEqual(self.related_texts(self.cats), [self.fish.text])
+        self.assertEqual(self.related_texts(self.fish), [self.cats.text])
+
+    def test_edit_updates_neighbours(self):
+        """Правка текста убирает пост из списков бывших соседей"""
+        related.update_stale()
+        self.client.post(
+            reverse('posts:post_edit', args=(self.fish.pk,)),
+            {'text': 'Футбол закончился поздно вечером'}
+        )
+        related.update_stale()
+        self.assertEqual(self.related_texts(self.cats), [])
+        self.assertEqual(
+            self.related_texts(self.football),
+            ['Футбол закончился поздно вечером']
+        )
+
+    def test_detail_adds_one_query(self):
+        """Похожие посты на странице поста - один запрос"""
+        related.rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.cats.pk,))
+            )
+        self.assertContains(response, 'Похожие записи')
+        related_queries = [
+            query for query in queries
+            if 'posts_relatedpost' in query['sql']
+        ]
+        self.assertEqual(len(related_queries), 1)
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer')
+        self.posts = [
+            Post.objects.create(author=self.user, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        self.buffer = counters.ViewBuffer(interval=3600, size=100)
+        self.addCleanup(self.buffer.reset)
+        patcher = mock.patch.object(counters, 'views', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views_in_db(self):
+        return list(
+            Post.objects.order_by('pk').values_list('views', flat=True)
+        )
+
+    def test_views_buffered_until_flush(self):
+        """Просмотры копятся в буфере и пишутся одним UPDATE на приращение"""
+        url = reverse('posts:post_detail', args=(self.posts[0].pk,))
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.context['post'].views, 2)
+        self.assertEqual(self.views_in_db(), [0, 0, 0])
+        for post in self.posts[1:]:
+            self.buffer.hit(post.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 4)
+        updates = [
+            query for query in queries if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.views_in_db(), [2, 1, 1])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_flush_by_size(self):
+        """Полный буфер сбрасывается сам, не дожидаясь интервала"""
+        self.buffer.size = 3
+        for _ in range(3):
+            self.buffer.hit(self.posts[0].pk)
+        self.assertEqual(self.views_in_db(), [3, 0, 0])
+        self.assertEqual(self.buffer.pending(self.posts[0].pk), 0)
+
+    def test_idle_buffer_flushed_by_timer(self):
+        """Одиночный просмотр сбрасывается таймером без новых запросов"""
+        self.buffer.interval = 0.01
+        with mock.patch.object(self.buffer, 'flush_in_background') as flush:
+            self.buffer.hit(self.posts[0].pk)
+            self.buffer.timer.join()
+        flush.assert_called_once_with()
+        self.buffer.timer = None
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.views_in_db(), [1, 0, 0])
+
+    def test_edit_keeps_flushed_views(self):
+        """Правка поста не затирает просмотры, сброшенные во время неё"""
+        post = self.posts[0]
+        buffer = self.buffer
+        buffer.hit(post.pk)
+
+        class FlushingForm(views.PostForm):
+            def save(self, *args, **kwargs):
+                buffer.flush()
+                return super().save(*args, **kwargs)
+
+        self.client.force_login(self.user)
+        with mock.patch.object(views, 'PostForm', FlushingForm):
+            self.client.post(
+                reverse('posts:post_edit', args=(post.pk,)),
+                {'text': 'Новый текст'}
+            )
+        post.refresh_from_db()
+        self.assertEqual((post.text, post.views), ('Новый текст', 1))
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other, cls.reader = [
+            User.objects.create_user(username=name)
+            for name in ('author', 'other', 'reader')
+        ]
+        cls.quiet, cls.discussed, cls.followed = [
+            Post.objects.create(author=author, text=text)
+            for author, text in (
+                (cls.other, 'Тихий пост'),
+                (cls.other, 'Обсуждаемый пост'),
+                (cls.author, 'Пост нового любимца'),
+            )
+        ]
+        cls.old = Post.objects.create(author=cls.other, text='Старый пост')
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=timezone.now() - timedelta(seconds=trending.WINDOW * 2)
+        )
+        for post in (cls.discussed, cls.discussed, cls.old):
+            Comment.objects.create(author=cls.reader, post=post, text='!')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_rank_by_decayed_activity(self):
+        """Рейтинг учитывает комментарии и подписки, старые посты - нет"""
+        self.assertEqual(trending.rank(), 3)
+        ranked = list(
+            TrendingPost.objects.order_by('rank').values_list(
+                'post_id', flat=True
+            )
+        )
+        self.assertEqual(
+            ranked, [self.discussed.pk, self.followed.pk, self.quiet.pk]
+        )
+        later = timezone.now() + timedelta(seconds=trending.HALF_LIFE)
+        scores = trending.score_posts(later)
+        self.assertAlmostEqual(scores[self.quiet.pk], 0.5, places=3)
+
+    def test_page_is_slice_of_ranking(self):
+        """Страница читает готовый рейтинг и не считает его сама"""
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        trending.rank()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.discussed.pk, self.followed.pk, self.quiet.pk]
+        )
+        self.assertFalse(any(
+            'posts_comment' in query['sql'] for query in queries
+        ))
+
+    def test_rank_task_reschedules_itself(self):
+        """Пересчёт ставит следующий, даже если на сайте нет записей"""
+        enqueue(tasks.rank_trending_posts)
+        start = timezone.now()
+        work('worker')
+        self.assertEqual(TrendingPost.objects.count(), 3)
+        pending = Job.objects.get(
+            name=tasks.rank_trending_posts.job_name, status=Job.QUEUED
+        )
+        self.assertGreaterEqual(
+            pending.run_at,
+            start + timedelta(seconds=tasks.TRENDING_INTERVAL)
+        )
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='feeder')
+        cls.group = Group.objects.create(
+            title='Лентовая группа', slug='feed-group', description='Лента'
+        )
+        Post.objects.create(
+            author=cls.author, group=cls.group, text='Первая запись'
+        )
+
+    def setUp(self):
+        cache.clear()
+        lookups.groups.clear()
+
+    def test_feeds_render(self):
+        """RSS и Atom ленты главной, группы и автора"""
+        feeds = {
+            reverse('posts:index_rss'): 'application/rss+xml',
+            reverse('posts:group_rss', args=(self.group.slug,)):
+                'application/rss+xml',
+            reverse('posts:author_atom', args=(self.author.username,)):
+                'application/atom+xml',
+        }
+        for url, content_type in feeds.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type
+                ))
+                self.assertContains(response, 'Первая запись')
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_unchanged_feed_is_not_modified(self):
+        """Повторный опрос без новых постов - 304 без запросов к базе"""
+        url = reverse('posts:group_rss', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Первая запись')
+
+    def test_new_post_changes_feed(self):
+        """Новый пост сбрасывает версию ленты группы"""
+        url = reverse('posts:group_rss', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(
+            author=self.author, group=self.group, text='Вторая запись'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Вторая запись')
+
+
+class FollowCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user(username='first_author')
+        cls.second = User.objects.create_user(username='second_author')
+        cls.reader = User.objects.create_user(username='first_reader')
+        cls.other = User.objects.create_user(username='second_reader')
+        Follow.objects.create(user=cls.reader, author=cls.first)
+        Follow.objects.create(user=cls.other, author=cls.second)
+        cls.post = Post.objects.create(author=cls.first, text='Первый автор')
+        Post.objects.create(author=cls.second, text='Второй автор')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def post_queries(self, client, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:follow_index'), data)
+        return response, [
+            query for query in queries if 'FROM "posts_post"' in query['sql']
+        ]
+
+    def test_pages_are_per_user(self):
+        """Каждый читатель видит ленту своих подписок"""
+        self.assertContains(
+            self.reader_client.get(reverse('posts:follow_index')),
+            'Первый автор',
+        )
+        response = self.other_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Второй автор')
+        self.assertNotContains(response, 'Первый автор')
+
+    def test_cached_page_skips_posts(self):
+        """Повторный запрос страницы не читает посты из базы"""
+        self.post_queries(self.reader_client)
+        response, queries = self.post_queries(self.reader_client)
+        self.assertEqual(queries, [])
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 1)
+        self.assertEqual(page_obj[0].text, 'Первый автор')
+
+    def test_author_post_invalidates_only_followers(self):
+        """Пост автора сбрасывает только страницы его подписчиков"""
+        self.post_queries(self.reader_client)
+        self.post_queries(self.other_client)
+        Post.objects.create(author=self.first, text='Новая запись')
+        response, queries = self.post_queries(self.reader_client)
+        self.assertNotEqual(queries, [])
+        self.assertContains(response, 'Новая запись')
+        _, queries = self.post_queries(self.other_client)
+        self.assertEqual(queries, [])
+
+    def test_edit_and_follow_invalidate(self):
+        """Правка поста и новая подписка меняют страницу"""
+        self.post_queries(self.reader_client)
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        response, _ = self.post_queries(self.reader_client)
+        self.assertContains(response, 'Исправленный текст')
+        Follow.objects.create(user=self.reader, author=self.second)
+        response, _ = self.post_queries(self.reader_client)
+        self.assertContains(response, 'Второй автор')
+
+    def test_page_spellings_share_entry(self):
+        """Разные записи одного номера страницы читают один кеш"""
+        self.post_queries(self.reader_client)
+        for page in ('1', '01', 'abc', ''):
+            with self.subTest(page=page):
+                _, queries = self.post_queries(
+                    self.reader_client, {'page': page}
+                )
+                self.assertEqual(queries, [])
+
+    def test_out_of_range_page_not_cached(self):
+        """Номер за последней страницей не заводит запись в кеше"""
+        for _ in range(2):
+            response, queries = self.post_queries(
+                self.reader_client, {'page': 99}
+            )
+            self.assertNotEqual(queries, [])
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_local_cache_keeps_page_briefly(self):
+        """Без общего кеша страница живёт недолго: сброс версий
+        в соседнем процессе сюда не доходит"""
+        self.post_queries(self.reader_client)
+        later = time.time() + versions.LOCAL_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            _, queries = self.post_queries(self.reader_client)
+        self.assertNotEqual(queries, [])
+
+    def test_shared_cache_keeps_full_timeout(self):
+        """С общим кешем страница живёт весь свой срок"""
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        }}
+        with self.settings(CACHES=shared):
+            self.assertEqual(
+                versions.cache_timeout(views.FOLLOW_CACHE_TIMEOUT),
+                views.FOLLOW_CACHE_TIMEOUT,
+            )
+        self.assertEqual(
+            versions.cache_timeout(views.FOLLOW_CACHE_TIMEOUT),
+            versions.LOCAL_CACHE_TIMEOUT,
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResponsiveImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='photographer')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('photo.gif', small_gif, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Просмотры тестовой базы не должны дожить до сброса
+        self.addCleanup(counters.views.reset)
+        cache.clear()
+        default.kvstore.clear_local()
+
+    def test_placeholder_generated_in_background(self):
+        """Задача строит кадры и сохраняет заглушку в пост"""
+        tasks.warm_thumbnails(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertTrue(
+            self.post.placeholder.startswith('data:image/jpeg;base64,')
+        )
+        self.post.image = ''
+        self.post.save()
+        tasks.warm_thumbnails(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.placeholder, '')
+
+    def test_backfill_command_enqueues_missing(self):
+        """Команда ставит задачи только постам без заглушки"""
+        Post.objects.create(author=self.author, text='Без картинки')
+        call_command('warm_post_images', stdout=io.StringIO())
+        jobs = Job.objects.filter(name=tasks.warm_thumbnails.job_name)
+        self.assertEqual(
+            [json.loads(job.payload)['args'] for job in jobs],
+            [[self.post.pk]],
+        )
+        jobs.delete()
+        tasks.warm_thumbnails(self.post.pk)
+        call_command('warm_post_images', stdout=io.StringIO())
+        self.assertFalse(jobs.exists())
+        call_command('warm_post_images', '--all', stdout=io.StringIO())
+        self.assertEqual(jobs.count(), 1)
+
+    def test_page_does_not_build_thumbnails(self):
+        """До задачи страница выводит исходную картинку и не строит кадры"""
+        with mock.patch('sorl.thumbnail.shortcuts.get_thumbnail') as build, \
+                mock.patch.object(images, 'get_thumbnail') as variants:
+            response = self.client.get(
+                reverse('posts:profile', args=(self.author.username,))
+            )
+        build.assert_not_called()
+        variants.assert_not_called()
+        self.assertContains(response, f'src="{self.post.image.url}"')
+        self.assertNotContains(response, 'srcset=')
+
+    def test_pages_emit_srcset(self):
+        """Ленты и страница поста отдают srcset с ленивой загрузкой"""
+        tasks.warm_thumbnails(self.post.pk)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                for width in images.VARIANT_WIDTHS:
+                    self.assertContains(response, f' {width}w')
+                self.assertContains(response, 'loading="lazy"')
+                self.assertContains(response, 'data:image/jpeg;base64,')
+
+    def test_page_thumbnails_read_in_one_query(self):
+        """Кадры страницы ленты читаются из базы одним запросом"""
+        png = io.BytesIO()
+        Image.new('RGB', (4, 3), 'red').save(png, 'PNG')
+        second = Post.objects.create(
+            author=self.author,
+            text='Другая картинка',
+            image=SimpleUploadedFile('red.png', png.getvalue(), 'image/png'),
+        )
+        for post in (self.post, second):
+            tasks.warm_thumbnails(post.pk)
+        cache.clear()
+        default.kvstore.clear_local()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('posts:index'))
+        thumbnail_queries = [
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(thumbnail_queries), 1)
+        self.assertContains(response, ' 320w', count=2 * len(images.FORMATS))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(any(
+            'thumbnail_kvstore' in query['sql']
+            for query in context.captured_queries
+        ))
+
+
+class SitemapTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_patch = override_settings(SITEMAP_ROOT=self.root)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        patcher = mock.patch.object(sitemaps, 'URLS_PER_FILE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user(username='mapped')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), encoding='utf-8') as file:
+            return file.read()
+
+    def mtime(self, name):
+        return os.stat(os.path.join(self.root, name)).st_mtime_ns
+
+    def test_build_splits_into_files(self):
+        """Адреса разбиты по файлам, индекс ссылается на все файлы"""
+        self.assertEqual(sitemaps.build(), 4)
+        index = self.read(sitemaps.INDEX_FILE)
+        for name in ('sitemap-posts-1.xml', 'sitemap-posts-2.xml',
+                     'sitemap-profiles-1.xml'):
+            self.assertIn(settings.SITEMAP_URL + name, index)
+        self.assertIn(
+            reverse('posts:post_detail', args=(self.posts[2].pk,)),
+            self.read('sitemap-posts-2.xml')
+        )
+
+    def test_incremental_build_keeps_full_files(self):
+        """Повторный запуск дописывает новые посты, полные файлы не трогает"""
+        sitemaps.build()
+        full_file = self.mtime('sitemap-posts-1.xml')
+        post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(sitemaps.build(), 2)
+        self.assertEqual(self.mtime('sitemap-posts-1.xml'), full_file)
+        self.assertIn(
+            reverse('posts:post_detail', args=(post.pk,)),
+            self.read('sitemap-posts-2.xml')
+        )
+        Post.objects.create(author=self.author, text='Ещё новее')
+        sitemaps.build()
+        self.assertIn('sitemap-posts-3.xml', self.read(sitemaps.INDEX_FILE))
+
+    def test_unchanged_sections_checked_with_exists(self):
+        """Без новых строк раздел проверяется одним запросом EXISTS"""
+        sitemaps.build()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(sitemaps.build(), 0)
+        # Пустой раздел групп читается как раньше, проверка не нужна
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'posts_group' not in query['sql']
+        ]
+        self.assertEqual(len(queries), 2)
+        for sql in queries:
+            self.assertIn('LIMIT 1', sql)
+
+    def test_site_url_required(self):
+        """Карта пишется с адресом сайта и не строится без него"""
+        with override_settings(SITE_URL='https://yatube.example'):
+            sitemaps.build()
+        self.assertIn(
+            '<loc>https://yatube.example' + settings.SITEMAP_URL,
+            self.read(sitemaps.INDEX_FILE)
+        )
+        with override_settings(SITE_URL=''):
+            with self.assertRaises(ImproperlyConfigured):
+                sitemaps.build()
@@ -0,0 +1,74 @@
+"""Лента популярного: рейтинг свежих постов по активности вокруг них.
+
+Оценка поста - сумма затухающих вкладов: сам пост, комментарии к нему
+и новые подписчики автора (делятся между его свежими постами). Вклад
+события уменьшается вдвое каждые HALF_LIFE секунд. Рейтинг считает
+пакетная задача по событиям за WINDOW секунд и сохраняет первые
+TRENDING_SIZE мест в TrendingPost; страница только читает срез.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, TrendingPost
+
+WINDOW = 60 * 60 * 24 * 3
+HALF_LIFE = 60 * 60 * 6
+POST_WEIGHT = 1
+COMMENT_WEIGHT = 2
+FOLLOW_WEIGHT = 3
+TRENDING_SIZE = 200
+READ_CHUNK = 5000
+
+
+def decay(now, moment):
+    return 0.5 ** ((now - moment).total_seconds() / HALF_LIFE)
+
+
+def score_posts(now):
+    """Оценки всех постов за окно: словарь id поста -> оценка."""
+    since = now - timedelta(seconds=WINDOW)
+    scores = {}
+    by_author = defaultdict(list)
+    posts = Post.objects.filter(pub_date__gte=since).order_by()
+    for pk, author_id, pub_date in posts.values_list(
+        'pk', 'author_id', 'pub_date'
+    ).iterator(READ_CHUNK):
+        scores[pk] = POST_WEIGHT * decay(now, pub_date)
+        by_author[author_id].append(pk)
+    comments = Comment.objects.filter(created__gte=since).order_by()
+    for post_id, created in comments.values_list(
+        'post_id', 'created'
+    ).iterator(READ_CHUNK):
+        # Комментарии к постам старше окна не учитываются
+        if post_id in scores:
+            scores[post_id] += COMMENT_WEIGHT * decay(now, created)
+    follows = Follow.objects.filter(created__gte=since).order_by()
+    for author_id, created in follows.values_list(
+        'author_id', 'created'
+    ).iterator(READ_CHUNK):
+        author_posts = by_author.get(author_id)
+        if not author_posts:
+            continue
+        share = FOLLOW_WEIGHT * decay(now, created) / len(author_posts)
+        for pk in author_posts:
+            scores[pk] += share
+    return scores
+
+
+def rank(now=None):
+    """Пересчитывает рейтинг и заменяет его целиком в одной транзакции."""
+    scores = score_posts(now or timezone.now())
+    top = heapq.nlargest(
+        TRENDING_SIZE, ((score, pk) for pk, score in scores.items())
+    )
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create(
+            TrendingPost(post_id=pk, rank=place, score=score)
+            for place, (score, pk) in enumerate(top, 1)
+        )
+    return len(top)
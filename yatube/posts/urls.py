@@ -1,11 +1,26 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('trending/', views.trending, name='trending'),
+    path('rss/', feeds.index_rss, name='index_rss'),
+    path('atom/', feeds.index_atom, name='index_atom'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path(
+        'profile/<str:username>/rss/',
+        feeds.author_rss,
+        name='author_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        feeds.author_atom,
+        name='author_atom'
+    ),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -17,6 +32,48 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('fragments/', views.index_fragments, name='index_fragments'),
+    path(
+        'group/<slug:slug>/fragments/',
+        views.group_fragments,
+        name='group_fragments'
+    ),
+    path(
+        'profile/<str:username>/followers/',
+        views.follow_list,
+        {'direction': 'followers'},
+        name='followers'
+    ),
+    path(
+        'profile/<str:username>/following/',
+        views.follow_list,
+        {'direction': 'following'},
+        name='following'
+    ),
+    path(
+        'profile/<str:username>/followers/json/',
+        views.follow_list_json,
+        {'direction': 'followers'},
+        name='followers_json'
+    ),
+    path(
+        'profile/<str:username>/following/json/',
+        views.follow_list_json,
+        {'direction': 'following'},
+        name='following_json'
+    ),
+    path(
+        'profile/<str:username>/fragments/',
+        views.profile_fragments,
+        name='profile_fragments'
+    ),
+    path('events/', views.index_events, name='index_events'),
+    path(
+        'group/<slug:slug>/events/',
+        views.group_events,
+        name='group_events'
+    ),
+    path('follow/events/', views.follow_events, name='follow_events'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
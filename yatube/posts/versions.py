@@ -0,0 +1,66 @@
+"""Версии наборов постов для ключей кеша.
+
+Версия набора (всех постов, постов автора или группы) - время его
+последнего изменения. Сигналы сохранения и удаления поста сбрасывают
+версии его наборов, а кеши, в ключ которых входит версия, просто
+перестают совпадать. Так новый пост автора устаревает только те
+кеши, что от него зависят.
+
+Сброс версии виден другим процессам только через общий кеш. Без него
+кеши по версиям живут не дольше LOCAL_CACHE_TIMEOUT.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.checks import LOCAL_CACHES
+
+from .models import Post
+
+# Ограничивает устаревание там, куда сигналы не доходят:
+# соседние процессы, смена группы поста при правке
+VERSION_TIMEOUT = 60 * 15
+# Срок кешей по версиям, когда кеш у каждого процесса свой
+LOCAL_CACHE_TIMEOUT = 10
+
+
+def version_key(scope):
+    return f'posts_version:{scope}'
+
+
+def cache_timeout(timeout):
+    """Срок кеша по версиям: короткий, если кеш не общий для процессов."""
+    if settings.CACHES['default']['BACKEND'] in LOCAL_CACHES:
+        return min(timeout, LOCAL_CACHE_TIMEOUT)
+    return timeout
+
+
+def get_versions(scopes):
+    """Версии наборов по именам; недостающие начинаются заново."""
+    keys = {version_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        found.update(missing)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def get_version(scope):
+    return get_versions([scope])[scope]
+
+
+def post_scopes(post):
+    scopes = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group_id}')
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_versions(sender, instance, **kwargs):
+    cache.delete_many([version_key(scope) for scope in post_scopes(instance)])
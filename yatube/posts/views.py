@@ -1,46 +1,121 @@
+import hashlib
+
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 
+from activity.tasks import schedule_rollup
+from core.jobs import enqueue, enqueue_unique
+from core.ratelimit import rate_limit
+from notifications.tasks import fan_out_post
+
+from . import counters, cursors, events, images, lookups, related
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, User
+from .models import Follow, Post
+from .rows import PageRows, PostRows
+from .suggestions import suggestions_for
+from .tasks import (schedule_suggestions, schedule_trending,
+                    update_related_posts, warm_thumbnails)
+from .versions import cache_timeout, get_versions
 
 LIMIT_POSTS = 10
+LIMIT_FOLLOWS = 50
+FOLLOW_CACHE_TIMEOUT = 60 * 5
+# Поля пользователя, которые нужны спискам подписчиков и подписок
+FOLLOW_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def page_or_first(value):
+    """Номер страницы из запроса, как его понимает get_page()."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 1
+
+
+def follow_page_key(user_id, authors, page_number):
+    """Ключ страницы подписок пользователя.
+
+    В ключ входят версии всех авторов из подписок: пост или правка
+    автора меняют ключи только его подписчиков, а подписка и отписка
+    меняют набор авторов и тоже дают новый ключ.
+    """
+    scopes = [f'author:{author}' for author in sorted(authors)]
+    state = ','.join(
+        f'{scope}={version}'
+        for scope, version in sorted(get_versions(scopes).items())
+    )
+    digest = hashlib.md5(state.encode()).hexdigest()
+    return f'follow_index:{user_id}:{page_number}:{digest}'
+
+
+def next_cursor(page_obj):
+    """Курсор для подгрузки постов после последнего на странице."""
+    if not page_obj.has_next():
+        return None
+    last = page_obj[len(page_obj) - 1]
+    return cursors.encode(last.pub_date, last.pk)
 
 
 def index(request):
     post_list = Post.objects.all()
-    paginator = Paginator(post_list, LIMIT_POSTS)
+    paginator = Paginator(PostRows(post_list), LIMIT_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    images.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
+        'next_cursor': next_cursor(page_obj),
+        'post_events': settings.POST_EVENTS,
     }
     return render(request, 'posts/index.html', context)
 
 
+def trending(request):
+    # Рейтинг считает задача rank_trending_posts, здесь только срез
+    posts = Post.objects.filter(
+        trending__isnull=False
+    ).order_by('trending__rank')
+    paginator = Paginator(PostRows(posts), LIMIT_POSTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    images.prefetch(page_obj)
+    context = {
+        'page_obj': page_obj,
+        'trending': True,
+    }
+    return render(request, 'posts/trending.html', context)
+
+
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = lookups.groups.get_or_404(slug)
     posts = group.posts.all()
-    paginator = Paginator(posts, LIMIT_POSTS)
+    paginator = Paginator(PostRows(posts), LIMIT_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    images.prefetch(page_obj)
     context = {
         'group': group,
         'posts': posts,
         'page_obj': page_obj,
+        'next_cursor': next_cursor(page_obj),
+        'post_events': settings.POST_EVENTS,
     }
     return render(request, 'posts/group_list.html', context)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.authors.get_or_404(username)
     user = request.user
     user_posts = author.posts.all()
-    paginator = Paginator(user_posts, LIMIT_POSTS)
+    paginator = Paginator(PostRows(user_posts), LIMIT_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    images.prefetch(page_obj)
     # Проверяем, что пользователь авторизован
     if user.is_authenticated:
         # Получаем список подписанных на автора пользователей
@@ -51,19 +126,25 @@ def profile(request, username):
             'author': author,
             'user_posts': user_posts,
             'page_obj': page_obj,
+            'next_cursor': next_cursor(page_obj),
             'following': following,
+            'suggestions': suggestions_for(user),
         }
     else:
         context = {
             'author': author,
             'user_posts': user_posts,
             'page_obj': page_obj,
+            'next_cursor': next_cursor(page_obj),
         }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
+    counters.views.hit(post.pk)
+    # Показываем и просмотры, которые ещё ждут сброса в базу
+    post.views += counters.views.pending(post.pk)
     user = post.author
     user_posts = user.posts.all()
     form = CommentForm()
@@ -74,17 +155,26 @@ def post_detail(request, post_id):
         'user_posts': user_posts,
         'form': form,
         'comments': comments,
+        'related_posts': related.related_for(post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@rate_limit('post_create')
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            enqueue(warm_thumbnails, post.pk)
+        enqueue(fan_out_post, post.pk)
+        related.index_post(post)
+        enqueue_unique(update_related_posts, delay=related.BATCH_DELAY)
+        schedule_rollup()
+        schedule_trending()
         return redirect('posts:profile', post.author)
     else:
         return render(request, 'posts/create_post.html', {'form': form})
@@ -92,7 +182,9 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    # Без views: save() отложенное поле не пишет и не затрёт просмотры,
+    # сброшенные из буфера, пока пост правили
+    post = get_object_or_404(Post.objects.defer('views'), id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
                     instance=post
@@ -113,11 +205,17 @@ def post_edit(request, post_id):
                       {'form': form}
                       )
     post = form.save()
-    post.save()
+    if 'image' in form.changed_data:
+        # И для очищенной картинки: задача сотрёт её заглушку
+        enqueue(warm_thumbnails, post.pk)
+    if 'text' in form.changed_data:
+        related.index_post(post)
+        enqueue_unique(update_related_posts, delay=related.BATCH_DELAY)
     return redirect('posts:post_detail', post.id)
 
 
 @login_required
+@rate_limit('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -126,6 +224,8 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        schedule_rollup()
+        schedule_trending()
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -133,46 +233,198 @@ def add_comment(request, post_id):
 def follow_index(request):
     user = request.user
     # Получаем список id авторов на которых подписаны
-    authors = user.follower.values_list('author', flat=True)
-    # Получаем список постов отфильтрованных по авторам на которых подписаны
-    posts_follow = Post.objects.filter(author__in=authors)
-    paginator = Paginator(posts_follow, LIMIT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    authors = list(user.follower.values_list('author_id', flat=True))
+    page_number = page_or_first(request.GET.get('page'))
+    key = follow_page_key(user.pk, authors, page_number)
+    cached = cache.get(key)
+    if cached is None:
+        # Получаем список постов отфильтрованных по авторам
+        posts_follow = Post.objects.filter(author__in=authors)
+        paginator = Paginator(PostRows(posts_follow), LIMIT_POSTS)
+        page_obj = paginator.get_page(page_number)
+        # Номер вне диапазона страниц не кешируем: иначе каждый
+        # такой номер занял бы в кеше копию крайней страницы
+        if page_obj.number == page_number:
+            cache.set(
+                key,
+                (paginator.count, page_obj.number, list(page_obj)),
+                cache_timeout(FOLLOW_CACHE_TIMEOUT),
+            )
+    else:
+        count, number, rows = cached
+        page_rows = PageRows(count, (number - 1) * LIMIT_POSTS, rows)
+        page_obj = Paginator(page_rows, LIMIT_POSTS).page(number)
+    images.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
+        'suggestions': suggestions_for(user),
+        'post_events': settings.POST_EVENTS,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@rate_limit('follow', methods=None)
 def profile_follow(request, username):
     user_follow = request.user
-    author_follow = get_object_or_404(User, username=username)
-    # Получаем список подписанных на автора пользователей
-    followers = author_follow.following.values_list('user', flat=True)
-    # Проверяем вхождение текущего пользователя в список followers
-    following = followers.filter(user=user_follow).exists()
+    author_follow = lookups.authors.get_or_404(username)
     # Пользователь не должен мочь подписываться сам на себя
     if user_follow == author_follow:
         raise PermissionDenied
-    # Пользователь может подписаться только один раз
-    if following:
-        raise PermissionDenied
-    Follow.objects.create(
-        user=user_follow,
-        author=author_follow,
+    # Один INSERT без предварительной проверки: повторная подписка
+    # упирается в уникальное ограничение и молча пропускается
+    Follow.objects.bulk_create(
+        [Follow(user=user_follow, author=author_follow)],
+        ignore_conflicts=True,
     )
+    schedule_rollup()
+    schedule_trending()
+    schedule_suggestions()
     return redirect('posts:profile', username)
 
 
 @login_required
+@rate_limit('follow', methods=None)
 def profile_unfollow(request, username):
     user_unfollow = request.user
-    author_unfollow = get_object_or_404(User, username=username)
-    unfollow = Follow.objects.filter(
+    author_unfollow = lookups.authors.get_or_404(username)
+    Follow.objects.filter(
         user=user_unfollow,
         author=author_unfollow
-    )
-    unfollow.delete()
+    ).delete()
     return redirect('posts:profile', username)
+
+
+def render_fragment(request, posts, template):
+    """Отдаёт только посты после курсора и курсор в X-Next-Cursor."""
+    try:
+        posts = cursors.seek(posts, request.GET.get('cursor'), 'pub_date')
+    except ValueError:
+        return HttpResponseBadRequest()
+    page, cursor = cursors.paginate(
+        PostRows(posts)[:LIMIT_POSTS + 1], LIMIT_POSTS, 'pub_date'
+    )
+    images.prefetch(page)
+    response = render(
+        request, template, {'page_obj': page, 'fragment': True}
+    )
+    if cursor:
+        response['X-Next-Cursor'] = cursor
+    return response
+
+
+def index_fragments(request):
+    return render_fragment(
+        request, Post.objects.all(), 'posts/includes/post_list.html'
+    )
+
+
+def group_fragments(request, slug):
+    group = lookups.groups.get_or_404(slug)
+    return render_fragment(
+        request, group.posts.all(), 'posts/includes/post_list.html'
+    )
+
+
+def profile_fragments(request, username):
+    author = lookups.authors.get_or_404(username)
+    return render_fragment(
+        request, author.posts.all(), 'posts/includes/profile_post_list.html'
+    )
+
+
+def follow_page(request, author, direction):
+    """Страница подписчиков (followers) или подписок (following) автора.
+
+    Один запрос с курсором по (created, id), без COUNT по всем связям.
+    """
+    if direction == 'followers':
+        follows = author.following.all()
+        related = 'user'
+    else:
+        follows = author.follower.all()
+        related = 'author'
+    follows = cursors.seek(follows, request.GET.get('cursor'), 'created')
+    # Обе связи нужны: по одной фильтрует related-менеджер, другую
+    # подтягивает select_related
+    follows = follows.select_related(related).only(
+        'created',
+        'user',
+        'author',
+        *(f'{related}__{field}' for field in FOLLOW_USER_FIELDS)
+    )
+    page, cursor = cursors.paginate(
+        follows[:LIMIT_FOLLOWS + 1], LIMIT_FOLLOWS, 'created'
+    )
+    users = [getattr(follow, related) for follow in page]
+    return users, cursor
+
+
+def follow_list(request, username, direction):
+    author = lookups.authors.get_or_404(username)
+    try:
+        users, cursor = follow_page(request, author, direction)
+    except ValueError:
+        return HttpResponseBadRequest()
+    context = {
+        'author': author,
+        'direction': direction,
+        'users': users,
+        'next_cursor': cursor,
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def follow_list_json(request, username, direction):
+    author = lookups.authors.get_or_404(username)
+    try:
+        users, cursor = follow_page(request, author, direction)
+    except ValueError:
+        return HttpResponseBadRequest()
+    return JsonResponse({
+        'results': [
+            {
+                'username': user.username,
+                'full_name': user.get_full_name(),
+            }
+            for user in users
+        ],
+        'next': cursor,
+    })
+
+
+def stream_events(request, matches):
+    if not settings.POST_EVENTS:
+        raise Http404
+    last_event_id = request.META.get('HTTP_LAST_EVENT_ID', '')
+    since = int(last_event_id) if last_event_id.isdigit() else None
+    response = StreamingHttpResponse(
+        events.event_stream(since, matches),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Запрещаем nginx буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def index_events(request):
+    return stream_events(request, lambda author_id, group_id: True)
+
+
+def group_events(request, slug):
+    group = lookups.groups.get_or_404(slug)
+    return stream_events(
+        request, lambda author_id, group_id: group_id == group.pk
+    )
+
+
+@login_required
+def follow_events(request):
+    # Подписки читаются один раз на соединение, а не на каждое событие
+    authors = set(
+        request.user.follower.values_list('author_id', flat=True)
+    )
+    return stream_events(
+        request, lambda author_id, group_id: author_id in authors
+    )
@@ -0,0 +1,30 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# Сколько секунд пользователь живёт в кеше без изменений
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша.
+
+    AuthenticationMiddleware вызывает get_user() на каждом запросе,
+    поэтому запрос к auth_user выполняется только при промахе кеша.
+    Запись сбрасывается сигналами при сохранении или удалении
+    пользователя, в том числе при смене пароля. Сброс виден другим
+    воркерам только при общем кеше, поэтому check --deploy не
+    пропускает LocMemCache (core.checks).
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user
@@ -4,7 +4,13 @@ from django.contrib.auth.forms import (AuthenticationForm,
                                        UserCreationForm
                                        )
 
+from core.jobs import enqueue
+
+from .tasks import send_password_reset
+
 User = get_user_model()
+# Ключи контекста письма, которые задача строит сама
+TOKEN_CONTEXT = ('user', 'uid', 'token')
 
 
 class CreationForm(UserCreationForm):
@@ -23,3 +29,21 @@ class PasswordResetForm(PasswordResetForm):
     class Meta:
         model = User
         fields = ('username', 'password')
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        """Отдаёт письмо воркеру: в очередь идут pk и имена шаблонов.
+
+        Ссылку с токеном строит задача, чтобы она не лежала в Job.payload.
+        """
+        user_id = context['user'].pk
+        context = {
+            key: value for key, value in context.items()
+            if key not in TOKEN_CONTEXT
+        }
+        enqueue(
+            send_password_reset, user_id,
+            subject_template_name, email_template_name, context,
+            from_email, to_email, html_email_template_name
+        )
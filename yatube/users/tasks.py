@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.jobs import task
+
+User = get_user_model()
+
+
+@task(priority=20)
+def send_password_reset(user_id, subject_template_name, email_template_name,
+                        context, from_email, to_email,
+                        html_email_template_name=None):
+    """Строит письмо сброса пароля со свежим токеном и отправляет его.
+
+    Токен и ссылка появляются только здесь, поэтому в аргументах задачи
+    в базе их нет.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    context = dict(
+        context,
+        user=user,
+        uid=urlsafe_base64_encode(force_bytes(user.pk)),
+        token=default_token_generator.make_token(user),
+    )
+    subject = render_to_string(subject_template_name, context)
+    subject = ''.join(subject.splitlines())
+    body = render_to_string(email_template_name, context)
+    message = EmailMultiAlternatives(subject, body, from_email, [to_email])
+    if html_email_template_name is not None:
+        message.attach_alternative(
+            render_to_string(html_email_template_name, context), 'text/html'
+        )
+    message.send()
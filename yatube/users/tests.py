@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .backends import user_cache_key
+
+User = get_user_model()
+
+
+class CachedUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='auth', password='old-password-123'
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_session_user_cached(self):
+        """Пользователь сессии берётся из кеша без запроса к auth_user."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        with self.assertNumQueries(1):
+            # Постов нет, поэтому остаётся только count ленты: счётчик
+            # уведомлений в шапке берётся из кеша
+            self.authorized_client.get(reverse('posts:index'))
+
+    def test_cached_user_invalidated_on_password_change(self):
+        """Смена пароля сбрасывает кеш и разлогинивает другие сессии."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.user.set_password('new-password-456')
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
@@ -44,6 +44,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
+    'notifications.apps.NotificationsConfig',
+    'activity.apps.ActivityConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
@@ -75,6 +77,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'notifications.context_processors.unread.unread',
             ],
         },
     },
@@ -133,20 +136,77 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Сессии читаются из кеша, в базу идут только записи и промахи
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Пользователь сессии тоже берётся из кеша
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+]
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Отправлять подписчикам дайджесты новых постов на почту
+NOTIFICATION_EMAIL_DIGESTS = True
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдаёт байты медиафайлов из core.media: None - сам Django,
+# 'x-accel-redirect' - nginx, 'x-sendfile' - Apache или lighttpd
+MEDIA_SENDFILE = None
+# internal-location nginx, который смотрит в MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Процессы, которые строят кадры core.resize, и предел их каталога
+RESIZE_WORKERS = 2
+RESIZE_CACHE_SIZE = 1024 * 1024 * 1024
+# Ключи миниатюр: LRU процесса перед кешем и базой, пакетное чтение
+THUMBNAIL_KVSTORE = 'core.thumbnails.KVStore'
+
+# Server-Sent Events о новых постах (posts.events). Каждая открытая
+# лента держит поток сервера до 5 минут: включать только с gevent- или
+# асинхронными воркерами, синхронные займёт десяток вкладок
+POST_EVENTS = False
+
+# Карту сайта пишет команда build_sitemaps, раздаётся она как статика
+SITEMAP_URL = '/sitemaps/'
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+# Адрес сайта для абсолютных ссылок в карте сайта. Без DEBUG берётся
+# только из окружения: build_sitemaps откажется писать карту без него
+SITE_URL = os.environ.get(
+    'SITE_URL', 'http://127.0.0.1:8000' if DEBUG else ''
+).rstrip('/')
+
+# Лимиты частоты запросов для core.ratelimit: ёмкость ведра и период
+# его наполнения, отдельно на пользователя и на IP
+RATE_LIMITS = {
+    'post_create': {'user': '20/m', 'ip': '60/m'},
+    'add_comment': {'user': '20/m', 'ip': '60/m'},
+    'follow': {'user': '60/m', 'ip': '120/m'},
+}
+
+# Сколько секунд хранятся выполненные и упавшие фоновые задачи;
+# удаляет их runworker (core.jobs.purge)
+JOB_RETENTION = 60 * 60 * 24 * 7
+
+# Заголовок с адресом клиента от доверенного прокси, ключ request.META:
+# например 'HTTP_X_REAL_IP' за nginx с proxy_set_header X-Real-IP
+# $remote_addr. Пусто - REMOTE_ADDR, иначе за прокси все клиенты
+# попадают в одно ведро лимита по IP
+CLIENT_IP_HEADER = os.environ.get('CLIENT_IP_HEADER', '')
 
-# Подключаем кеширование
+# Подключаем кеширование. LocMemCache - только для разработки: у каждого
+# процесса он свой, check --deploy требует общий кеш (core.checks)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
@@ -14,16 +14,30 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import media, resize
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path(
+        'notifications/',
+        include('notifications.urls', namespace='notifications')
+    ),
+    path('activity/', include('activity.urls', namespace='activity')),
+    path('resize/<path:path>', resize.serve, name='resize'),
+    # Проверки и заголовки - здесь, сами байты отдаёт фронтовой сервер
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$',
+        media.serve,
+        name='media'
+    ),
 ]
 
 handler404 = 'core.views.page_not_found'
@@ -31,5 +45,5 @@ handler403 = 'core.views.forbidden'
 handler500 = 'core.views.internal_server_error'
 if settings.DEBUG:
     urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
+        settings.SITEMAP_URL, document_root=settings.SITEMAP_ROOT
     )